@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+This file contains the registry of the assets used by all the parts of the project (web scraping, data generation and data analysis).
+The assets are read from a json file (assets.json by default) and more assets can be registered from code.
+"""
+import json
+import os
+
+
+class AssetRegistry():
+    """
+    This class allows to know which assets are available and how each one is obtained, stored and drawn.
+    """
+    def __init__(self, path_to_json_file: str=None):
+        """
+        Init AssetRegistry. Read the assets from a json file, a list of objects with the following keys:
+         - "acronym": short name used in the portfolios (e.g. "ST").
+         - "label": name used in the graphs (e.g. "Stocks").
+         - "dataset_name": name used to select the asset in the web scraping part (e.g. "Stocks").
+         - "csv_name": name of the csv file of the asset (e.g. "amundi-msci-wrld-ae-c.csv").
+         - "asset_code": code of the asset in the searcher of the web page (e.g. "0P00012PP6").
+         - "stockmarket": stock market of the asset in the search results of the web page (e.g. "Fund - Luxembourg fund").
+         - "color": color of the asset in the graphs.
+         - "price_divisor": the prices of the web page are divided by this value (e.g. 100 for the US Dollar Index).
+
+        Args:
+            path_to_json_file (str):
+                A string indicating the path to the json file. By default = None (assets.json next to this file).
+        """
+
+        if path_to_json_file is None: path_to_json_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets.json")
+        # Parameter checking.
+        try:
+            assert os.path.isfile(path_to_json_file), f"\033[1m ERROR: \033[0m The path to the assets json file ({path_to_json_file}) is not valid."
+        except AssertionError as error:
+            print(error)
+            exit(1)
+
+        self.assets = {}
+        with open(path_to_json_file, encoding="utf-8") as f:
+            for asset in json.load(f):
+                self.register(**asset)
+
+
+    def register(self, acronym: str, label: str, dataset_name: str, csv_name: str, asset_code: str, stockmarket: str, color: str="gray", price_divisor: float=1):
+        """
+        Add an asset to the registry (or replace the asset with the same acronym).
+
+        Args:
+            acronym (str):
+                A string with the short name used in the portfolios.
+            label (str):
+                A string with the name used in the graphs.
+            dataset_name (str):
+                A string with the name used to select the asset in the web scraping part.
+            csv_name (str):
+                A string with the name of the csv file of the asset.
+            asset_code (str):
+                A string with the code of the asset in the searcher of the web page.
+            stockmarket (str):
+                A string with the stock market of the asset in the search results of the web page.
+            color (str):
+                A string with the color of the asset in the graphs. By default = "gray".
+            price_divisor (float):
+                The prices of the web page are divided by this value. By default = 1.
+        """
+
+        self.assets[acronym] = {"acronym": acronym, "label": label, "dataset_name": dataset_name, "csv_name": csv_name, "asset_code": asset_code, "stockmarket": stockmarket, "color": color, "price_divisor": price_divisor}
+
+
+    @property
+    def acronyms(self):
+        """
+        Acronyms of the registered assets, in registration order (the column order of the portfolios).
+        """
+
+        return list(self.assets.keys())
+
+
+    def get(self, acronym: str):
+        """
+        Obtain the information of an asset.
+
+        Args:
+            acronym (str):
+                A string with the acronym of the asset.
+        Returns:
+            dict with the keys described in __init__().
+        """
+
+        return self.assets[acronym]
+
+
+    def find(self, key: str, value):
+        """
+        Obtain the assets whose key has a value (e.g. find("asset_code", "CRPS")).
+
+        Args:
+            key (str):
+                A string with the key of the asset information.
+            value:
+                The wanted value.
+        Returns:
+            list of dict with the information of the assets.
+        """
+
+        return [asset for asset in self.assets.values() if asset[key] == value]
+
+
+DEFAULT_ASSET_REGISTRY = AssetRegistry()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+This file contains the benchmarks of the generation -> metrics -> plotting pipeline.
+Each case runs offline, against the csv files of web_scraping_csv_files_folder or against synthetic price series, in its own process (so the peak memory of a case is not mixed with the others).
+The results (wall time, peak RSS and portfolios per second of each stage) are written as JSON, which can be compared with the JSON of another commit.
+
+Please, execute this file with the command: python3 benchmarks/benchmark.py --output results.json [--compare old_results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from math import comb
+import numpy as np
+import pandas as pd
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_FOLDER)
+from asset_registry.asset_registry import AssetRegistry
+from data_generation.data_generation import Portfolio
+
+BUNDLED_CSV_FOLDER = os.path.join(ROOT_FOLDER, "web_scraping_csv_files_folder")
+# Each case: name, number of assets, increment/decrement, date range, synthetic prices or bundled csv files, if the graphs are rendered and, optionally, the chunk size (streaming path).
+CASES = [
+    {"name": "bundled-5assets-step20-2020", "n_assets": 5, "step": 20, "start_date": "2020-01-01", "end_date": "2020-12-31", "synthetic": False, "graphs": True},
+    {"name": "bundled-5assets-step10-2020", "n_assets": 5, "step": 10, "start_date": "2020-01-01", "end_date": "2020-12-31", "synthetic": False, "graphs": True},
+    {"name": "bundled-5assets-step5-2020", "n_assets": 5, "step": 5, "start_date": "2020-01-01", "end_date": "2020-12-31", "synthetic": False, "graphs": True},
+    {"name": "bundled-5assets-step2-2020", "n_assets": 5, "step": 2, "start_date": "2020-01-01", "end_date": "2020-12-31", "synthetic": False, "graphs": True},
+    {"name": "bundled-5assets-step2-2020-chunked", "n_assets": 5, "step": 2, "start_date": "2020-01-01", "end_date": "2020-12-31", "synthetic": False, "graphs": False, "chunk_size": 100000},
+    {"name": "bundled-5assets-step5-2020H1", "n_assets": 5, "step": 5, "start_date": "2020-01-01", "end_date": "2020-06-30", "synthetic": False, "graphs": False},
+    {"name": "bundled-3assets-step1-2020", "n_assets": 3, "step": 1, "start_date": "2020-01-01", "end_date": "2020-12-31", "synthetic": False, "graphs": False},
+    {"name": "synthetic-5assets-step5-1y", "n_assets": 5, "step": 5, "start_date": "2020-01-01", "end_date": "2020-12-31", "synthetic": True, "graphs": False},
+    {"name": "synthetic-5assets-step5-5y", "n_assets": 5, "step": 5, "start_date": "2016-01-01", "end_date": "2020-12-31", "synthetic": True, "graphs": False},
+    {"name": "synthetic-8assets-step10-1y", "n_assets": 8, "step": 10, "start_date": "2020-01-01", "end_date": "2020-12-31", "synthetic": True, "graphs": False},
+    {"name": "synthetic-10assets-step10-1y", "n_assets": 10, "step": 10, "start_date": "2020-01-01", "end_date": "2020-12-31", "synthetic": True, "graphs": False},
+]
+QUICK_CASES = ["bundled-5assets-step20-2020", "bundled-5assets-step5-2020", "synthetic-5assets-step5-5y", "synthetic-8assets-step10-1y"]
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of the current process since it started.
+
+    Returns:
+        float with the peak RSS in MB.
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux gives KB and macOS gives bytes.
+    return peak/(1024**2 if sys.platform == "darwin" else 1024)
+
+
+def create_synthetic_assets(folder_path: str, n_assets: int, start_date: str, end_date: str, seed: int=0):
+    """
+    Create csv files with the format of investing.com (newest day first, "Dec 31, 2020" dates, "K" volumes) with random walk prices, and their registry.
+
+    Args:
+        folder_path (str):
+            A string indicating the folder where the csv files are saved.
+        n_assets (int):
+            Number of assets.
+        start_date (str):
+            First date (YYYY-MM-DD) of the prices.
+        end_date (str):
+            Last date (YYYY-MM-DD) of the prices.
+        seed (int):
+            Seed of the prices. By default = 0.
+    Returns:
+        AssetRegistry with the synthetic assets (acronyms "A0", "A1", ...).
+    """
+
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start=start_date, end=end_date)[::-1]
+    assets = []
+    for i in range(n_assets):
+        # Geometric random walk with a different drift and volatility for each asset.
+        log_returns = rng.normal(rng.uniform(-2e-4, 6e-4), rng.uniform(2e-3, 2e-2), size=len(dates))
+        prices = np.round(rng.uniform(20, 300)*np.exp(np.cumsum(log_returns[::-1]))[::-1], 2)
+        change = np.round(np.append(prices[:-1]/prices[1:] - 1, 0)*100, 2)
+        volume = rng.uniform(0.1, 999, size=len(dates)).round(2)
+        csv_name = f"synthetic-{i}.csv"
+        pd.DataFrame({"Date": dates.strftime("%b %d, %Y"), "Price": prices, "Vol.": [f"{vol}K" for vol in volume], "Change %": [f"{chg}%" for chg in change]}).to_csv(os.path.join(folder_path, csv_name), index=False)
+        assets.append({"acronym": f"A{i}", "label": f"Asset {i}", "dataset_name": f"Asset {i}", "csv_name": csv_name, "asset_code": f"A{i}", "stockmarket": "Synthetic"})
+
+    with open(os.path.join(folder_path, "assets.json"), "w", encoding="utf-8") as f:
+        json.dump(assets, f)
+
+    return AssetRegistry(os.path.join(folder_path, "assets.json"))
+
+
+def run_case(case: dict):
+    """
+    Run the pipeline of a case (allocations, cleaning, metrics and graphs) and measure each stage.
+    It must run in its own process, because the peak RSS is the one of the whole process.
+
+    Args:
+        case (dict):
+            One of the CASES.
+    Returns:
+        dict with the wall time ("wall_s"), the peak RSS until the end of the stage ("peak_rss_mb") and the throughput ("portfolios_per_s") of each stage.
+    """
+
+    work_folder = tempfile.mkdtemp(prefix="benchmark-")
+    stages = {}
+
+    def measure(stage, function, num_portfolios=None):
+        start = time.perf_counter()
+        result = function()
+        wall = time.perf_counter() - start
+        stages[stage] = {"wall_s": round(wall, 6), "peak_rss_mb": round(peak_rss_mb(), 3), "portfolios_per_s": round(num_portfolios/wall, 1) if num_portfolios and wall > 0 else None}
+        return result
+
+    try:
+        stages["startup"] = {"wall_s": 0.0, "peak_rss_mb": round(peak_rss_mb(), 3), "portfolios_per_s": None}
+        if case["synthetic"]:
+            csv_folder = os.path.join(work_folder, "csv")
+            os.mkdir(csv_folder)
+            registry = create_synthetic_assets(csv_folder, case["n_assets"], case["start_date"], case["end_date"])
+        else:
+            csv_folder = BUNDLED_CSV_FOLDER
+            registry = None
+        portfolio = Portfolio(folder_path=os.path.join(work_folder, "portfolios"), assets=" ".join((registry.acronyms if registry else ["ST", "CB", "PB", "GO", "CA"])[:case["n_assets"]]), increment_decrement=case["step"], start_date=case["start_date"], end_date=case["end_date"], asset_registry=registry)
+
+        chunk_size = case.get("chunk_size")
+        num_portfolios = comb(100//case["step"] + case["n_assets"] - 1, case["n_assets"] - 1)
+        # With chunk_size the allocations are not kept in memory (None) and the metrics take them from the enumerator.
+        portfolio_allocations = measure("allocations", lambda: portfolio.generate_portfolio_allocations_csv(chunk_size=chunk_size), num_portfolios)
+        treated = measure("treat_csv_files", lambda: portfolio.treat_csv_files(web_scraping_csv_folder_path=csv_folder))
+        price_panel = measure("price_panel", lambda: portfolio.build_price_panel(treat_csv_files=treated))
+        measure("metrics", lambda: portfolio.generate_portfolio_metrics_csv(price_panel=price_panel, portfolio_allocations=portfolio_allocations, purchase_date=case["start_date"], chunk_size=chunk_size), num_portfolios)
+        if case["graphs"]:
+            # Imported here, so the cases without graphs do not load matplotlib.
+            from data_analysis.data_analysis import CreateGraphsFromCsv
+            graphs = CreateGraphsFromCsv(path_to_csv_file=os.path.join(work_folder, "portfolios", "portfolio_metrics.csv"), folder_to_save_graphs=os.path.join(work_folder, "graphs"))
+            measure("graphs", graphs.render_all, num_portfolios)
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    return {"num_portfolios": num_portfolios, "num_days": len(price_panel), "stages": stages}
+
+
+def run_case_in_subprocess(case: dict):
+    """
+    Run a case in a new Python process and read its result.
+
+    Args:
+        case (dict):
+            One of the CASES.
+    Returns:
+        dict returned by run_case().
+    """
+
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", json.dumps(case)], capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"case '{case['name']}' failed:\n{process.stdout}{process.stderr}")
+
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    """
+    Commit of the working copy (None outside a git repository).
+
+    Returns:
+        str with the commit hash ("-dirty" suffix with uncommitted changes).
+    """
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_FOLDER, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT_FOLDER, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return commit + ("-dirty" if dirty else "")
+
+
+def run_benchmarks(cases: list, repeat: int=3):
+    """
+    Run every case "repeat" times and keep, for each stage, the fastest wall time and the lowest peak RSS (the least noisy values).
+
+    Args:
+        cases (list):
+            The cases to run.
+        repeat (int):
+            Number of runs of each case. By default = 3.
+    Returns:
+        dict with the environment (commit, versions, machine) and the results of each case.
+    """
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "cases": {},
+    }
+    for case in cases:
+        runs = [run_case_in_subprocess(case) for _ in range(repeat)]
+        stages = {}
+        for stage in runs[0]["stages"]:
+            best = min(runs, key=lambda run: run["stages"][stage]["wall_s"])["stages"][stage]
+            stages[stage] = {"wall_s": best["wall_s"], "peak_rss_mb": min(run["stages"][stage]["peak_rss_mb"] for run in runs), "portfolios_per_s": best["portfolios_per_s"]}
+        results["cases"][case["name"]] = {"params": {key: value for key, value in case.items() if key != "name"}, "num_portfolios": runs[0]["num_portfolios"], "num_days": runs[0]["num_days"], "stages": stages}
+        print(f"{case['name']}: " + ", ".join(f"{stage} {values['wall_s']:.3f}s" for stage, values in stages.items() if stage != "startup") + f", peak {max(values['peak_rss_mb'] for values in stages.values()):.0f} MB", file=sys.stderr)
+
+    return results
+
+
+def compare_results(old: dict, new: dict, threshold: float=0.2):
+    """
+    Compare the wall time and peak RSS of the stages of two benchmark results.
+
+    Args:
+        old (dict):
+            The results of the reference commit.
+        new (dict):
+            The results of the new commit.
+        threshold (float):
+            Relative increase that is considered a regression. By default = 0.2 (20%).
+    Returns:
+        list of str with the regressions found (empty if there are none).
+    """
+
+    regressions = []
+    for name, case in new["cases"].items():
+        if name not in old["cases"]: continue
+        for stage, values in case["stages"].items():
+            old_values = old["cases"][name]["stages"].get(stage)
+            if old_values is None: continue
+            for metric in ["wall_s", "peak_rss_mb"]:
+                # Times under 10 ms are too noisy to be compared.
+                if metric == "wall_s" and max(old_values[metric], values[metric]) < 0.01: continue
+                ratio = values[metric]/old_values[metric] if old_values[metric] > 0 else float("inf")
+                print(f"{name:32} {stage:16} {metric:12} {old_values[metric]:10.3f} -> {values[metric]:10.3f} ({ratio:5.2f}x)", file=sys.stderr)
+                if ratio > 1 + threshold: regressions.append(f"{name} {stage} {metric}: {old_values[metric]} -> {values[metric]} ({ratio:.2f}x)")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the generation -> metrics -> plotting pipeline.")
+    parser.add_argument("--output", help="path of the JSON file with the results (standard output by default)")
+    parser.add_argument("--compare", help="JSON file of a previous run; the command fails if a stage got slower or bigger than the threshold")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative increase considered a regression (default 0.2)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each case, the best one is kept (default 3)")
+    parser.add_argument("--quick", action="store_true", help="run only a few small cases")
+    parser.add_argument("--cases", nargs="+", help="names of the cases to run")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        # Child process of run_case_in_subprocess().
+        print(json.dumps(run_case(json.loads(args.case))))
+        sys.exit(0)
+
+    selected = args.cases if args.cases else (QUICK_CASES if args.quick else [case["name"] for case in CASES])
+    unknown = [name for name in selected if name not in [case["name"] for case in CASES]]
+    if unknown: parser.error(f"unknown cases: {', '.join(unknown)}")
+    results = run_benchmarks([case for case in CASES if case["name"] in selected], args.repeat)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare_results(json.load(f), results, args.threshold)
+        if regressions:
+            print("\033[1m ERROR: \033[0m Regressions found:\n - " + "\n - ".join(regressions), file=sys.stderr)
+            sys.exit(1)
@@ -5,39 +5,176 @@ The code below, generate some graphs based on portfolio_metrics.csv, created by
 """
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
 import seaborn as sns
 import os
 import numpy as np
+from data_generation.data_generation import pareto_front, load_portfolio_metrics, metrics_to_dataframe
+from asset_registry.asset_registry import AssetRegistry, DEFAULT_ASSET_REGISTRY
+from profiling.profiling import profiled
 
 
 class CreateGraphsFromCsv():
     """
     This class allows to spawn the graphs.
     """
-    def __init__(self, path_to_csv_file: str, folder_to_save_graphs: str):
+    def __init__(self, path_to_csv_file: str, folder_to_save_graphs: str, asset_registry: AssetRegistry=None, period: tuple=None):
         """
         Init CreateGraphsFromCsv.
         
         Args:
             path_to_csv_file (str): 
-                A string indicating the path to portfolio_metrics.csv.
+                A string indicating the path to portfolio_metrics.csv (or portfolio_metrics.npy).
             folder_to_save_graphs (str):
                 A string that indicates the folder where you want to save the graphs.
+            asset_registry (AssetRegistry):
+                The registry with the assets (name and color of each one in the graphs). By default = None (asset_registry/assets.json).
+            period (tuple):
+                The (purchase date, selling date) of the portfolios, written in the titles (portfolio_metrics.csv does not store it). By default = None (no dates in the titles).
         """
         
         # Parameter checking.
         try:
             assert os.path.isfile(path_to_csv_file), f"\033[1m ERROR: \033[0m The path to the csv file ({path_to_csv_file}) is not valid."
-            assert "portfolio_metrics.csv" in path_to_csv_file, "\033[1m ERROR: \033[0m The file is not a portfolio_metrics.csv file. Please, check the path."
+            assert "portfolio_metrics.csv" in path_to_csv_file or "portfolio_metrics.npy" in path_to_csv_file, "\033[1m ERROR: \033[0m The file is not a portfolio_metrics.csv or portfolio_metrics.npy file. Please, check the path."
         except AssertionError as error:
             print(error)
             exit(1)
         if os.path.isdir(folder_to_save_graphs) == False: os.mkdir(folder_to_save_graphs)
         self.folder_to_save_graphs = folder_to_save_graphs
         self.path_to_csv_file = path_to_csv_file
+        self.asset_registry = DEFAULT_ASSET_REGISTRY if asset_registry is None else asset_registry
+        self.period = period
+        self._data = None
         
         
-    def bar_plot_type_portfolio(self, title="Number of each portfolio", x_label=None, y_label="Number of Portfolios", save_graph=True):
+    @profiled(rows=lambda data: len(data["df"]))
+    def _load_data(self):
+        """
+        Read portfolio_metrics.csv (or portfolio_metrics.npy) and compute, only once, the data shared by all the graphs: the type of each portfolio (positive, neutral or negative return) and the aggregates of each type.
+        
+        Returns:
+            dict with the pd.DataFrame ("df"), the asset columns ("name_assets"), the type of each portfolio ("type_portfolio"), the number of portfolios of each type ("count_type"), the average investment in each asset for each type ("mean_assets_type") and the average return for each percentage invested in each asset ("mean_return_asset").
+        """
+        
+        if self._data is None:
+            df = metrics_to_dataframe(load_portfolio_metrics(self.path_to_csv_file)) if self.path_to_csv_file.endswith(".npy") else pd.read_csv(self.path_to_csv_file)
+            name_assets = [name for name in list(df.columns) if name in self.asset_registry.acronyms]
+            types = ["Negative portfolio", "Neutral portfolio", "Positive portfolio"]
+            type_codes = np.sign(df["RETURN"].fillna(0).to_numpy()).astype(np.int8) + 1
+            type_portfolio = pd.Categorical.from_codes(type_codes, categories=types)
+            df["COLOR"] = np.array(["red", "blue", "green"])[type_codes]
+            groups = df.groupby(type_portfolio, observed=False)
+            self._data = {
+                "df": df,
+                "name_assets": name_assets,
+                "type_portfolio": type_portfolio,
+                "count_type": groups.size().reindex(types, fill_value=0),
+                "mean_assets_type": groups[name_assets].mean().reindex(types),
+                "mean_return_asset": {name: df.groupby(self._percentage_groups(df[name]))["RETURN"].mean().sort_index() for name in name_assets},
+            }
+        
+        return self._data
+    
+    
+    def _percentage_groups(self, percentages: pd.Series):
+        """
+        Percentages used to group the portfolios: the grid ones as they are, the sampled ones (not integers) rounded to steps of 10.
+        
+        Args:
+            percentages (pd.Series):
+                The percentage invested in an asset by each portfolio.
+        Returns:
+            pd.Series with the percentage group of each portfolio.
+        """
+        
+        if np.array_equal(percentages.to_numpy(), np.round(percentages.to_numpy())): return percentages
+        return (np.round(percentages/10)*10).astype(int)
+    
+    
+    def _num_rows(self):
+        """
+        Number of portfolios of the file, without loading it (the npy header or the lines of the csv file).
+        
+        Returns:
+            int with the number of portfolios.
+        """
+        
+        if self._data is not None: return len(self._data["df"])
+        if self.path_to_csv_file.endswith(".npy"): return len(load_portfolio_metrics(self.path_to_csv_file))
+        with open(self.path_to_csv_file, "rb") as csv_file:
+            num_lines = sum(block.count(b"\n") for block in iter(lambda: csv_file.read(2**20), b""))
+        
+        return max(num_lines - 1, 0)
+    
+    
+    def _iter_blocks(self, columns: list, chunk_size: int=1000000):
+        """
+        Read some columns of portfolio_metrics.csv (or portfolio_metrics.npy) block by block: memory-mapped slices of the npy file or chunks of the csv file.
+        
+        Args:
+            columns (list):
+                The columns to read.
+            chunk_size (int):
+                Number of rows read at a time. By default = 1000000.
+        Returns:
+            Generator of dict with one np.ndarray (float64) for each column.
+        """
+        
+        if self.path_to_csv_file.endswith(".npy"):
+            metrics = load_portfolio_metrics(self.path_to_csv_file)
+            for start in range(0, len(metrics), chunk_size):
+                block = metrics[start:start + chunk_size]
+                # float32 metrics back to the values of the csv file (rounded to 3 decimals), see metrics_to_dataframe().
+                yield {col: np.round(block[col].astype(np.float64), 3) if col in ["RETURN", "VOLAT"] else block[col].astype(np.float64) for col in columns}
+        else:
+            for block in pd.read_csv(self.path_to_csv_file, usecols=columns, chunksize=chunk_size):
+                yield {col: block[col].to_numpy(dtype=np.float64) for col in columns}
+    
+    
+    def _finish_graph(self, fig, file_name: str, save_graph: bool, show: bool):
+        """
+        Save (if wanted) and show (if wanted) a graph, and release its figure.
+        
+        Args:
+            fig (matplotlib.figure.Figure):
+                The figure of the graph.
+            file_name (str):
+                A string indicating the name of the png file.
+            save_graph (bool): 
+                A boolean indicating if the user want to save the graph.
+            show (bool):
+                A boolean indicating if the graph is shown (blocks until the window is closed).
+        """
+        
+        if save_graph: fig.savefig(self.folder_to_save_graphs + "/" + file_name)
+        if show: plt.show()
+        plt.close(fig)
+        
+        
+    @profiled()
+    def render_all(self, save_graph=True):
+        """
+        Create all the graphs without showing them (non-interactive Agg backend), e.g. for batch runs. The previous backend is restored at the end.
+        
+        Args:
+            save_graph (bool): 
+                A boolean indicating if the user want to save the graphs.
+        """
+        
+        backend = plt.get_backend()
+        plt.switch_backend("Agg")
+        try:
+            self.bar_plot_type_portfolio(save_graph=save_graph, show=False)
+            self.bar_plot_investing_asset(save_graph=save_graph, show=False)
+            self.bar_plot_sum_assets(save_graph=save_graph, show=False)
+            self.scatter_chart(save_graph=save_graph, show=False)
+        finally:
+            plt.switch_backend(backend)
+        
+        
+    @profiled()
+    def bar_plot_type_portfolio(self, title="Number of each portfolio", x_label=None, y_label="Number of Portfolios", save_graph=True, show=True):
         """
         Create a bar plot which indicates the number of portfolios of each type (positive, negative or neutral return).
         
@@ -50,110 +187,123 @@ class CreateGraphsFromCsv():
                 A string indicating the label for y-axe.
             save_graph (bool): 
                 A boolean indicating if the user want to save the graph.
+            show (bool):
+                A boolean indicating if the graph is shown.
         """
         
-        df = pd.read_csv(self.path_to_csv_file)
+        count_type = self._load_data()["count_type"]
         
         bars = ["Positive Portfolio", "Neutral Portfolio", "Negative Portfolio"]
-        data = [len(df[df["RETURN"] > 0]), len(df[df["RETURN"] == 0]), len(df[df["RETURN"] < 0])]
-        df = pd.DataFrame(data, bars, columns=["Number of Portfolios"])
+        data = [count_type["Positive portfolio"], count_type["Neutral portfolio"], count_type["Negative portfolio"]]
         sns.set(style="darkgrid")
-        sns.barplot(x=list(df.index), y=list(df["Number of Portfolios"]), palette=["green", "blue", "red"])
-        plt.xlabel(x_label)
-        plt.ylabel(y_label)
-        plt.title(title)
-        if save_graph: plt.savefig(self.folder_to_save_graphs + "/bar_plot.png")
-        plt.show()
+        fig, ax = plt.subplots()
+        ax.bar(bars, data, color=["green", "blue", "red"])
+        ax.set_xlabel(x_label)
+        ax.set_ylabel(y_label)
+        ax.set_title(title)
+        self._finish_graph(fig, "bar_plot.png", save_graph, show)
         
     
-    def bar_plot_sum_assets(self, title="Average percentage of investments for each type of portfolio since 2020-01-01 to 2020-12-31", y_label="Average investment percentage", save_graph=True):
+    @profiled()
+    def bar_plot_sum_assets(self, title=None, y_label="Average investment percentage", save_graph=True, show=True, max_bars=10):
         """
         Create a bar plot of the sum of investments in each asset for each type of portfolio (Positive, negative or neutral return).
         
         Args:
             title (str): 
-                A string indicating the title for the bar plot.
+                A string indicating the title for the bar plot. By default = None ("Average percentage of investments for each type of portfolio", with the period if it is known).
             y_label (str): 
                 A string indicating the label for y-axe.
             save_graph (bool): 
                 A boolean indicating if the user want to save the graph.
+            show (bool):
+                A boolean indicating if the graph is shown.
+            max_bars (int):
+                Maximum number of assets drawn as bars (one legend entry each); with more assets a heatmap (one row per type of portfolio, one column per asset) is drawn instead. By default = 10.
         """
 
-        df = pd.read_csv(self.path_to_csv_file)
-        df["TYPE_PORTFOLIO"] = ["Positive portfolio" if x > 0 else "Negative portfolio" if x < 0 else "Neutral portfolio" for x in df["RETURN"]]
-        labels = list(np.unique(df["TYPE_PORTFOLIO"]))
-        name_assets = [name for name in list(df.columns) if name in ["ST", "CB", "PB", "GO", "CA"]]
-        asset_sum_percentage = {}
-
-        for name in name_assets:
-            asset_sum_percentage[name] = [df[df["RETURN"] < 0][name].mean(), df[df["RETURN"] == 0][name].mean(), df[df["RETURN"] > 0][name].mean()]
+        if title is None:
+            title = "Average percentage of investments for each type of portfolio" + ("" if self.period is None else f"\nsince {self.period[0]} to {self.period[1]}")
+        data = self._load_data()
+        mean_assets_type = data["mean_assets_type"]
+        labels = list(mean_assets_type.index)
+        asset_sum_percentage = {name: list(mean_assets_type[name]) for name in data["name_assets"]}
 
-        barWidth = 0.1
+        if len(asset_sum_percentage) > max_bars:
+            values = mean_assets_type[data["name_assets"]].to_numpy(dtype=np.float64)
+            fig, ax = plt.subplots(figsize=(min(2 + 0.2*len(asset_sum_percentage), 30), 4))
+            fig.subplots_adjust(bottom=0.2)
+            image = ax.imshow(np.ma.masked_invalid(values), aspect="auto", cmap="viridis", interpolation="nearest")
+            fig.colorbar(image, ax=ax, label=y_label)
+            ax.set_xticks(np.arange(len(asset_sum_percentage)), list(asset_sum_percentage), rotation=90, fontsize=6)
+            ax.set_yticks(np.arange(len(labels)), labels)
+            ax.grid(False)
+            ax.set_title(title)
+            self._finish_graph(fig, "bar_plot_sum_assets.png", save_graph, show)
+            return
 
-        r1 = np.arange(3) 
-        r2 = [x + barWidth for x in r1]
-        r3 = [x + barWidth for x in r2]
-        r4 = [x + barWidth for x in r3]
-        r5 = [x + barWidth for x in r4]
+        # One bar for each asset next to each other (0.1 width for up to 8 assets, narrower with more).
+        barWidth = min(0.1, 0.8/max(len(asset_sum_percentage), 1))
 
-        plt.subplots(figsize=(8,8))
+        fig, _ = plt.subplots(figsize=(8,8))
 
-        for k, v in asset_sum_percentage.items():
-            if k == "ST":
-                plt.bar(r1, v, color="blue", width=barWidth, edgecolor="white", label='Stocks')
-            elif k == "CB":
-                plt.bar(r2, v, color="red", width=barWidth, edgecolor="white", label='Corporate Bonds')
-            elif k == "PB":
-                plt.bar(r3, v, color="green", width=barWidth, edgecolor="white", label='Public Bonds')
-            elif k == "GO":
-                plt.bar(r4, v, color="yellow", width=barWidth, edgecolor="white", label='Gold')
-            elif k == "CA":   
-                plt.bar(r5, v, color="purple", width=barWidth, edgecolor="white", label='Cash')
+        for i, (k, v) in enumerate(asset_sum_percentage.items()):
+            asset = self.asset_registry.get(k)
+            plt.bar(np.arange(3) + i*barWidth, v, color=asset["color"], width=barWidth, edgecolor="white", label=asset["label"])
 
         plt.ylabel(y_label)
-        plt.xticks(np.arange(3)+barWidth+0.1, labels)
+        plt.xticks(np.arange(3) + barWidth*(len(asset_sum_percentage) - 1)/2, labels)
         plt.title(title)
         plt.legend()
-        if save_graph: plt.savefig(self.folder_to_save_graphs + "/bar_plot_sum_assets.png")
-        plt.show()
+        self._finish_graph(fig, "bar_plot_sum_assets.png", save_graph, show)
         
         
-    def bar_plot_investing_asset(self, title="Average return investing in ", x_label="Percentage of investement", y_label="Average return", save_graph=True):
+    @profiled()
+    def bar_plot_investing_asset(self, title="Average return per percentage invested in each asset", x_label="Percentage of investement", y_label="Asset", save_graph=True, show=True):
         """
-        Create one bar plot for each asset and each one show the return per percentage invested in that asset.
+        Create a heatmap (one row per asset, one column per percentage invested) with the average return of the portfolios that invest that percentage in that asset.
         
         Args:
             title (str): 
-                A string indicating the title for the bar plot.
+                A string indicating the title for the heatmap.
             x_label (str): 
                 A string indicating the label for x-axe.
             y_label (str): 
                 A string indicating the label for y-axe.
             save_graph (bool): 
                 A boolean indicating if the user want to save the graph.
+            show (bool):
+                A boolean indicating if the graph is shown.
         """
-        df = pd.read_csv(self.path_to_csv_file)
-        name_assets = [name for name in list(df.columns) if name in ["ST", "CB", "PB", "GO", "CA"]]
-    
-        fig, ax = plt.subplots(5, 1, figsize=(10, 20))
-        idx = 0
-        for name in name_assets:
-            df2 = df[[name, "RETURN"]]
-            df2 = df2.groupby(name).mean().sort_values(name)
-            
-            sns.set(style="darkgrid")
-            sns.barplot(ax=ax[idx], x=list(df2.index), y=list(df2["RETURN"]), palette=["green", "blue", "red", "yellow", "orange", "purple"])
-            ax[idx].set_xlabel(x_label)
-            ax[idx].set_ylabel(y_label)
-            ax[idx].set_title(title + name)
-            idx += 1
         
-        fig.tight_layout()   
-        if save_graph: plt.savefig(self.folder_to_save_graphs + "/average_return_investing_asset.png")    
-        plt.show()
+        data = self._load_data()
+        # Assets x percentages matrix (NaN where no portfolio invests that percentage in that asset).
+        mean_return = pd.DataFrame({name: data["mean_return_asset"][name] for name in data["name_assets"]}).sort_index().T
+        values = mean_return.to_numpy(dtype=np.float64)
+        limit = np.nanmax(np.abs(values)) if np.isfinite(values).any() else 0
+        limit = limit if limit > 0 else 1
+        
+        # The height grows with the number of assets, up to 20 inches (0.8 inches at the bottom for the x labels).
+        height = min(3 + 0.3*len(mean_return), 20)
+        fig, ax = plt.subplots(figsize=(10, height))
+        fig.subplots_adjust(bottom=0.8/height)
+        image = ax.imshow(np.ma.masked_invalid(values), aspect="auto", cmap="RdYlGn", vmin=-limit, vmax=limit, interpolation="nearest")
+        fig.colorbar(image, ax=ax, label="Average return")
+        ax.set_xticks(np.arange(mean_return.shape[1]), [str(percentage) for percentage in mean_return.columns])
+        ax.set_yticks(np.arange(len(mean_return)), list(mean_return.index), fontsize=10 if len(mean_return) <= 20 else 6)
+        ax.grid(False)
+        # The values are written in the cells while they are readable.
+        if values.size <= 200:
+            for (row, col), value in np.ndenumerate(values):
+                if not np.isnan(value): ax.text(col, row, f"{value:.2f}", ha="center", va="center", fontsize=8)
+        ax.set_xlabel(x_label)
+        ax.set_ylabel(y_label)
+        ax.set_title(title)
+        self._finish_graph(fig, "average_return_investing_asset.png", save_graph, show)
         
             
-    def scatter_chart(self, x="VOLAT", y="RETURN", color="COLOR", title="Risk-Return bubble chart", x_label="Risk (Volatility)", y_label="Return", save_graph=True):
+    @profiled()
+    def scatter_chart(self, x="VOLAT", y="RETURN", color="COLOR", title="Risk-Return bubble chart", x_label="Risk (Volatility)", y_label="Return", save_graph=True, show=True, mode="auto", bins=200, max_markers=20000, chunk_size=1000000):
         """
         Create a scatter chart from csv specified in the constructor of the class .
         
@@ -172,19 +322,65 @@ class CreateGraphsFromCsv():
                 A string indicating the label for y-axe.
             save_graph (bool): 
                 A boolean indicating if the user want to save the graph.
+            show (bool):
+                A boolean indicating if the graph is shown.
+            mode (str):
+                "scatter" draws one marker per portfolio, "density" draws the portfolios binned in a 2D histogram with the efficient frontier overlaid, reading the file block by block (its memory depends on the bins and chunk_size, not on the number of portfolios). By default = "auto" ("density" when there are more than max_markers portfolios).
+            bins (int):
+                Number of bins of each axis in "density" mode. By default = 200.
+            max_markers (int):
+                Maximum number of portfolios drawn as markers in "auto" mode. By default = 20000.
+            chunk_size (int):
+                Number of rows read at a time in "density" mode (the file is never loaded whole). By default = 1000000.
         """
         
-        df = pd.read_csv(self.path_to_csv_file)
-        df["COLOR"] = ["green" if x > 0 else "red" if x < 0 else "blue" for x in df["RETURN"]]
-        df["TYPE_PORTFOLIO"] = ["Positive portfolio" if x > 0 else "Negative portfolio" if x < 0 else "Neutral portfolio" for x in df["RETURN"]]
+        if mode == "auto": mode = "scatter" if self._num_rows() <= max_markers else "density"
 
-        plt.subplots(figsize=(8,8))
-        plt.scatter(x = df[df["RETURN"] > 0][x], s=100, y = df[df["RETURN"] > 0][y], c=df[df["RETURN"] > 0][color], cmap="Accent", alpha=0.6, edgecolors="white", linewidth=2 , label="Positive Portfolio")
-        plt.scatter(x = df[df["RETURN"] == 0][x], s=100, y = df[df["RETURN"] == 0][y], c=df[df["RETURN"] == 0][color], cmap="Accent", alpha=0.6, edgecolors="white", linewidth=2, label="Neutral Portfolio")
-        plt.scatter(x = df[df["RETURN"] < 0][x], s=100, y = df[df["RETURN"] < 0][y], c=df[df["RETURN"] < 0][color], cmap="Accent", alpha=0.6, edgecolors="white", linewidth=2, label="Negative Portfolio")
+        if mode == "density":
+            # First pass: range of the values (fixed edges for every block).
+            limits = np.array([[np.inf, -np.inf], [np.inf, -np.inf]])
+            for block in self._iter_blocks([x, y], chunk_size):
+                valid = ~(np.isnan(block[x]) | np.isnan(block[y]))
+                if valid.any():
+                    limits[0] = min(limits[0, 0], block[x][valid].min()), max(limits[0, 1], block[x][valid].max())
+                    limits[1] = min(limits[1, 0], block[y][valid].min()), max(limits[1, 1], block[y][valid].max())
+            limits[~np.isfinite(limits)] = 0
+            # Constant values get a bin of width 1 around them.
+            limits[limits[:, 0] == limits[:, 1]] += [-0.5, 0.5]
+            
+            # Second pass: histogram of each block and efficient portfolios of each block (the efficient frontier is the one of their union).
+            counts = np.zeros((bins, bins))
+            candidates_x, candidates_y = [np.empty(0)], [np.empty(0)]
+            for block in self._iter_blocks([x, y], chunk_size):
+                valid = ~(np.isnan(block[x]) | np.isnan(block[y]))
+                counts += np.histogram2d(block[x][valid], block[y][valid], bins=bins, range=limits)[0]
+                front = pareto_front(block[x], block[y])
+                candidates_x.append(block[x][front])
+                candidates_y.append(block[y][front])
+            candidates_x, candidates_y = np.concatenate(candidates_x), np.concatenate(candidates_y)
+            front = pareto_front(candidates_x, candidates_y)
+            
+            fig, ax = plt.subplots(figsize=(8,8))
+            counts[counts == 0] = np.nan
+            image = ax.imshow(counts.T, origin="lower", aspect="auto", extent=(*limits[0], *limits[1]), cmap="viridis", norm=LogNorm(), interpolation="nearest")
+            fig.colorbar(image, ax=ax, label="Number of portfolios")
+            ax.plot(candidates_x[front], candidates_y[front], color="red", linewidth=2, label="Efficient frontier")
+            ax.axhline(0, color="white", linewidth=1, linestyle="--")
+            plt.legend()
+            plt.title(title)
+            plt.xlabel(x_label)
+            plt.ylabel(y_label)
+            self._finish_graph(fig, "scatter_chart.png", save_graph, show)
+            return
+        
+        data = self._load_data()
+        df, type_portfolio = data["df"], data["type_portfolio"]
+        fig, ax = plt.subplots(figsize=(8,8))
+        for type_name, label in [("Positive portfolio", "Positive Portfolio"), ("Neutral portfolio", "Neutral Portfolio"), ("Negative portfolio", "Negative Portfolio")]:
+            df_type = df[type_portfolio == type_name]
+            plt.scatter(x = df_type[x], s=100, y = df_type[y], c=df_type[color], alpha=0.6, edgecolors="white", linewidth=2, label=label)
         plt.legend()
         plt.title(title)
         plt.xlabel(x_label)
         plt.ylabel(y_label)
-        if save_graph: plt.savefig(self.folder_to_save_graphs + "/scatter_chart.png")
-        plt.show()  
\ No newline at end of file
+        self._finish_graph(fig, "scatter_chart.png", save_graph, show)  
\ No newline at end of file
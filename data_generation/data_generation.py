@@ -3,18 +3,799 @@
 This file contains all the code implementation corresponding to the part 2 of the project.
 The code below, generate portfolios, treat the csv files from web scraping part and generate metrics (return, volatility) for each portfolio.
 """
-from itertools import product
+from collections import deque
+from functools import cached_property, lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import glob
+from math import comb
+from multiprocessing import shared_memory
 import pandas as pd
 import os
 import numpy as np
 import re
+import shutil
+import hashlib
+import json
+from asset_registry.asset_registry import AssetRegistry, DEFAULT_ASSET_REGISTRY
+from profiling.profiling import profiled, add_rows
+
+
+def _simplex_lattice(units: int, n_assets: int, start: int=0, stop: int=None):
+    """
+    Build the rows [start, stop) of the simplex lattice, i.e. every way of splitting "units" weight units among "n_assets" assets, in descending lexicographic order.
+    Each row is obtained directly from its rank (stars-and-bars unranking), so time and memory only depend on the number of rows requested.
+    
+    Args:
+        units (int):
+            An integer indicating the total number of weight units to split (100/increment_decrement).
+        n_assets (int):
+            An integer indicating the number of assets (columns).
+        start (int):
+            First rank to build. By default = 0.
+        stop (int):
+            Last rank (excluded) to build. By default = None (all the lattice).
+    Returns:
+        np.ndarray of shape (stop-start, n_assets) with the number of units of each asset.
+    """
+    
+    total = comb(units + n_assets - 1, n_assets - 1)
+    stop = total if stop is None else min(stop, total)
+    ranks = np.arange(start, max(start, stop), dtype=np.int64)
+    lattice = np.empty((len(ranks), n_assets), dtype=np.int64)
+    remaining = np.full(len(ranks), units, dtype=np.int64)
+    for col in range(n_assets - 1):
+        parts_left = n_assets - col - 1
+        # Number of rows whose value in this column is >= remaining - s, for s = 0..units (hockey-stick identity).
+        rows_until = np.array([comb(s + parts_left, parts_left) for s in range(units + 1)], dtype=np.int64)
+        s = np.searchsorted(rows_until, ranks, side="right")
+        ranks = ranks - np.where(s > 0, rows_until[np.maximum(s - 1, 0)], 0)
+        lattice[:, col] = remaining - s
+        remaining = s
+    lattice[:, n_assets - 1] = remaining
+    
+    return lattice
+
+
+@lru_cache(maxsize=8)
+def _sparse_lattice_counts(units: int, n_assets: int, max_nonzero: int):
+    """
+    Number of ways of splitting u units among n assets with at most k assets with weight, for every u <= units, n <= n_assets and k <= max_nonzero.
+    
+    Args:
+        units (int):
+            An integer indicating the total number of weight units to split (100/increment_decrement).
+        n_assets (int):
+            An integer indicating the number of assets (columns).
+        max_nonzero (int):
+            Maximum number of assets with weight of each allocation.
+    Returns:
+        np.ndarray (int) of shape (n_assets + 1, units + 1, max_nonzero + 1).
+    """
+    
+    # The splits with exactly j assets with weight: the combinations of j assets times the splits of the units with at least one unit each.
+    return np.array([[[1 if u == 0 else sum(comb(n, j)*comb(u - 1, j - 1) for j in range(1, min(k, n, u) + 1)) for k in range(max_nonzero + 1)] for u in range(units + 1)] for n in range(n_assets + 1)], dtype=np.int64)
+
+
+def _sparse_simplex_lattice(units: int, n_assets: int, max_nonzero: int, start: int=0, stop: int=None):
+    """
+    Build the rows [start, stop) of the simplex lattice restricted to the allocations with at most "max_nonzero" assets, in descending lexicographic order.
+    Each row is obtained directly from its rank, as in _simplex_lattice(), so time and memory only depend on the number of rows requested (not on the size of the lattice).
+    
+    Args:
+        units (int):
+            An integer indicating the total number of weight units to split (100/increment_decrement).
+        n_assets (int):
+            An integer indicating the number of assets (columns).
+        max_nonzero (int):
+            Maximum number of assets with weight of each allocation.
+        start (int):
+            First rank to build. By default = 0.
+        stop (int):
+            Last rank (excluded) to build. By default = None (all the lattice).
+    Returns:
+        np.ndarray of shape (stop-start, n_assets) with the number of units of each asset.
+    """
+    
+    counts = _sparse_lattice_counts(units, n_assets, max_nonzero)
+    total = counts[n_assets, units, max_nonzero]
+    stop = total if stop is None else min(stop, total)
+    ranks = np.arange(start, max(start, stop), dtype=np.int64)
+    lattice = np.zeros((len(ranks), n_assets), dtype=np.int64)
+    # Rows still being built, with their units and assets with weight left (a row without units left only has zeros after).
+    rows = np.arange(len(ranks))
+    remaining = np.full(len(ranks), units, dtype=np.int64)
+    nonzero_left = np.full(len(ranks), max_nonzero, dtype=np.int64)
+    for col in range(n_assets - 1):
+        cols_after = n_assets - col - 1
+        # The rows with 0 units in this column are the last ones.
+        zero_start = counts[cols_after + 1, remaining, nonzero_left] - counts[cols_after, remaining, nonzero_left]
+        is_zero = ranks >= zero_start
+        ranks = np.where(is_zero, ranks - zero_start, ranks)
+        idx = np.flatnonzero(~is_zero)
+        # Otherwise the value goes from the remaining units down to 1, each one followed by its splits of the other columns.
+        value = np.zeros(len(idx), dtype=np.int64)
+        undecided = np.ones(len(idx), dtype=bool)
+        for units_after in range(units):
+            active = undecided & (units_after < remaining[idx])
+            if not active.any(): break
+            rows_of_value = counts[cols_after, units_after, nonzero_left[idx] - 1]
+            chosen = active & (ranks[idx] < rows_of_value)
+            value[chosen] = remaining[idx][chosen] - units_after
+            undecided &= ~chosen
+            ranks[idx] = np.where(active & ~chosen, ranks[idx] - rows_of_value, ranks[idx])
+        lattice[rows[idx], col] = value
+        remaining[idx] -= value
+        nonzero_left[idx] -= 1
+        keep = remaining > 0
+        rows, ranks, remaining, nonzero_left = rows[keep], ranks[keep], remaining[keep], nonzero_left[keep]
+    lattice[rows, n_assets - 1] = remaining
+    
+    return lattice
+
+
+def _first_primes(count: int):
+    """
+    First "count" prime numbers (bases of the Halton sequence).
+    
+    Args:
+        count (int):
+            An integer indicating how many prime numbers are wanted.
+    Returns:
+        np.ndarray with the prime numbers.
+    """
+    
+    limit = 16
+    while True:
+        sieve = np.ones(limit, dtype=bool)
+        sieve[:2] = False
+        for i in range(2, int(limit**0.5) + 1):
+            if sieve[i]: sieve[i*i::i] = False
+        primes = np.flatnonzero(sieve)
+        if len(primes) >= count: return primes[:count]
+        limit *= 2
+
+
+def _halton(start: int, stop: int, dims: int):
+    """
+    Points [start, stop) of the Halton low-discrepancy sequence in the unit cube (one prime base for each dimension).
+    Every point is obtained directly from its index (radical inverse), so any block can be built on its own.
+    
+    Args:
+        start (int):
+            Index of the first point.
+        stop (int):
+            Index of the last point (excluded).
+        dims (int):
+            An integer indicating the dimension of the points.
+    Returns:
+        np.ndarray of shape (stop-start, dims) with values in [0, 1).
+    """
+    
+    points = np.zeros((max(stop - start, 0), dims))
+    for dim, base in enumerate(_first_primes(dims)):
+        # Index 0 is the origin, so the sequence starts at index 1.
+        idx = np.arange(start + 1, stop + 1, dtype=np.int64)
+        scale = 1.0
+        while idx.size and idx.max() > 0:
+            scale /= base
+            idx, digit = np.divmod(idx, base)
+            points[:, dim] += digit*scale
+    
+    return points
+
+
+def _cube_to_simplex(points: np.ndarray):
+    """
+    Map points of the unit cube of dimension n-1 to the simplex of n weights (the gaps between the sorted coordinates), keeping uniformity.
+    
+    Args:
+        points (np.ndarray):
+            Matrix of shape (rows, n-1) with values in [0, 1).
+    Returns:
+        np.ndarray of shape (rows, n) with non-negative weights that add up to 1.
+    """
+    
+    edges = np.sort(points, axis=1)
+    edges = np.hstack([np.zeros((len(points), 1)), edges, np.ones((len(points), 1))])
+    
+    return np.diff(edges, axis=1)
+
+
+class MetricContext():
+    """
+    This class allows the metrics of the registry to share the arrays of a slice of portfolios: each one is computed only once (when a metric needs it) and reused by the others.
+    """
+    def __init__(self, portfolio_values: np.ndarray, periods_per_year: int=365):
+        """
+        Init MetricContext.
+        
+        Args:
+            portfolio_values (np.ndarray):
+                Matrix portfolios x days with the value of each portfolio since the purchase date.
+            periods_per_year (int):
+                Number of days (rows of the price panel) in a year, to annualize. By default = 365 (calendar days).
+        """
+        
+        self.values = portfolio_values
+        self.periods_per_year = periods_per_year
+        self._worst_returns = {}
+        
+        
+    @cached_property
+    def returns(self):
+        """
+        Matrix portfolios x (days - 1) with the daily simple returns.
+        """
+        
+        returns = self.values[:, 1:]/self.values[:, :-1]
+        returns -= 1
+        return returns
+    
+    
+    @cached_property
+    def returns_mean(self):
+        """
+        Mean of the daily simple returns of each portfolio.
+        """
+        
+        return self.returns.mean(axis=1)
+    
+    
+    @cached_property
+    def returns_std(self):
+        """
+        Sample standard deviation of the daily simple returns of each portfolio.
+        """
+        
+        return self.returns.std(axis=1, ddof=1)
+    
+    
+    def worst_returns(self, num_days: int):
+        """
+        The num_days worst daily simple returns of each portfolio, sorted from the worst one. Only these columns are kept (the vectorized sort of numpy is faster than np.partition for these rows).
+        
+        Args:
+            num_days (int):
+                Number of worst days.
+        Returns:
+            np.ndarray (portfolios x num_days).
+        """
+        
+        if num_days not in self._worst_returns:
+            self._worst_returns[num_days] = np.sort(self.returns, axis=1)[:, :num_days].copy()
+        return self._worst_returns[num_days]
+
+
+METRIC_REGISTRY = {}
+# Number of values (portfolios x days) of each slice on which the metrics of the registry are evaluated.
+METRIC_SLICE_SIZE = 2**20
+
+
+def register_metric(name: str, function):
+    """
+    Add a metric to the registry, so that it can be selected by its name in generate_portfolio_metrics_csv(metrics=[...]).
+    
+    Args:
+        name (str):
+            A string with the name of the metric (name of its column).
+        function (function):
+            Function that receives a MetricContext and returns a np.ndarray with one value per portfolio.
+    """
+    
+    METRIC_REGISTRY[name] = function
+
+
+def sharpe_ratio(risk_free_rate: float=0.0):
+    """
+    Annualized Sharpe ratio of the daily returns.
+    
+    Args:
+        risk_free_rate (float):
+            Annual risk free rate (e.g. 0.02). By default = 0.0.
+    Returns:
+        function for register_metric().
+    """
+    
+    def metric(context: MetricContext):
+        return (context.returns_mean - risk_free_rate/context.periods_per_year)/context.returns_std*np.sqrt(context.periods_per_year)
+    
+    return metric
+
+
+def sortino_ratio(risk_free_rate: float=0.0):
+    """
+    Annualized Sortino ratio: like the Sharpe ratio, but only the returns under the risk free rate count as risk (downside deviation).
+    
+    Args:
+        risk_free_rate (float):
+            Annual risk free rate (e.g. 0.02). By default = 0.0.
+    Returns:
+        function for register_metric().
+    """
+    
+    def metric(context: MetricContext):
+        daily_rate = risk_free_rate/context.periods_per_year
+        # Returns under the risk free rate, computed in a single temporal matrix.
+        downside = np.minimum(context.returns, daily_rate)
+        downside -= daily_rate
+        np.square(downside, out=downside)
+        return (context.returns_mean - daily_rate)/np.sqrt(downside.mean(axis=1))*np.sqrt(context.periods_per_year)
+    
+    return metric
+
+
+def max_drawdown(context: MetricContext):
+    """
+    Maximum drawdown (percentage lost from the highest previous value), computed with the running maximum of each portfolio.
+    
+    Args:
+        context (MetricContext):
+            The arrays of the block of portfolios.
+    Returns:
+        np.ndarray with the maximum drawdown (%) of each portfolio.
+    """
+    
+    # The running maximum is replaced by the ratio value/running maximum in place.
+    ratio = np.maximum.accumulate(context.values, axis=1)
+    np.divide(context.values, ratio, out=ratio)
+    
+    return (1 - ratio.min(axis=1))*100
+
+
+def historical_var(confidence: float=0.95):
+    """
+    Historical Value at Risk of the daily returns: the daily loss (%) that is only exceeded in 1 - confidence of the days.
+    
+    Args:
+        confidence (float):
+            Confidence level. By default = 0.95.
+    Returns:
+        function for register_metric().
+    """
+    
+    def metric(context: MetricContext):
+        if context.returns.shape[1] == 0: return np.full(len(context.values), np.nan)
+        worst_days = max(int(np.ceil((1 - confidence)*context.returns.shape[1])), 1)
+        return -context.worst_returns(worst_days)[:, -1]*100
+    
+    return metric
+
+
+def historical_cvar(confidence: float=0.95):
+    """
+    Historical Conditional Value at Risk (expected shortfall): the average daily loss (%) of the days beyond the Value at Risk.
+    
+    Args:
+        confidence (float):
+            Confidence level. By default = 0.95.
+    Returns:
+        function for register_metric().
+    """
+    
+    def metric(context: MetricContext):
+        if context.returns.shape[1] == 0: return np.full(len(context.values), np.nan)
+        worst_days = max(int(np.ceil((1 - confidence)*context.returns.shape[1])), 1)
+        return -context.worst_returns(worst_days).mean(axis=1)*100
+    
+    return metric
+
+
+def log_return_volatility(context: MetricContext):
+    """
+    Annualized volatility (%) of the daily log returns.
+    
+    Args:
+        context (MetricContext):
+            The arrays of the block of portfolios.
+    Returns:
+        np.ndarray with the volatility of each portfolio.
+    """
+    
+    # The log returns are not kept in the context, only their deviation is needed.
+    return np.log1p(context.returns).std(axis=1, ddof=1)*np.sqrt(context.periods_per_year)*100
+
+
+register_metric("SHARPE", sharpe_ratio())
+register_metric("SORTINO", sortino_ratio())
+register_metric("MAX_DRAWDOWN", max_drawdown)
+register_metric("VAR_95", historical_var(0.95))
+register_metric("CVAR_95", historical_cvar(0.95))
+register_metric("LOG_VOLAT", log_return_volatility)
+
+
+def _portfolio_metrics(weights: np.ndarray, purchase_prices: np.ndarray, current_prices: np.ndarray, prices: np.ndarray, metrics: tuple=(), periods_per_year: int=365):
+    """
+    Compute RETURN and VOLAT (and the selected metrics of the registry) for a block of portfolios with matrix products (no per-portfolio Python objects).
+    The matrix of portfolio values is computed once and shared by all the metrics, which are evaluated on slices of METRIC_SLICE_SIZE values so that their temporal matrices do not grow with the block.
+    
+    Args:
+        weights (np.ndarray):
+            Matrix portfolios x assets with the percentage invested in each asset.
+        purchase_prices (np.ndarray):
+            Vector with the price of each asset on the purchase date.
+        current_prices (np.ndarray):
+            Vector with the price of each asset on the last date.
+        prices (np.ndarray):
+            Matrix assets x days with the prices of each asset since the purchase date (included).
+        metrics (tuple):
+            Names of other metrics of METRIC_REGISTRY. By default = () (only RETURN and VOLAT).
+        periods_per_year (int):
+            Number of days (rows of the price panel) in a year, to annualize the metrics. By default = 365.
+    Returns:
+        tuple with the np.ndarray (RETURN, VOLAT and one for each metric) of one value per portfolio, rounded to 3 decimals.
+    """
+    
+    money_invested = 10000 # This value really does not matter.
+    # Number of shares of each asset in each portfolio.
+    num_shares = (weights*money_invested/100)/purchase_prices
+    # RETURN.
+    buy_amount = num_shares @ purchase_prices
+    current_value = num_shares @ current_prices
+    # VOLATILITY: value of every portfolio for all days since purchase date (Rows=portfolios Cols=days).
+    portfolio_values = num_shares @ prices
+    std_dev = portfolio_values.std(axis=1, ddof=1)
+    sample_avg = portfolio_values.mean(axis=1)
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        portfolio_return = np.round(((current_value-buy_amount)/buy_amount)*100, 3)
+        portfolio_volat = np.round((std_dev/sample_avg)*100, 3)
+        other_metrics = [np.empty(len(portfolio_values)) for _ in metrics]
+        slice_rows = max(METRIC_SLICE_SIZE // max(portfolio_values.shape[1], 1), 1)
+        for start in range(0, len(portfolio_values) if metrics else 0, slice_rows):
+            context = MetricContext(portfolio_values[start:start + slice_rows], periods_per_year)
+            for values, name in zip(other_metrics, metrics):
+                values[start:start + slice_rows] = METRIC_REGISTRY[name](context)
+        other_metrics = [np.round(values, 3) for values in other_metrics]
+    
+    return (portfolio_return, portfolio_volat, *other_metrics)
+
+
+def _window_price_sums(prices: np.ndarray, purchase_idx: np.ndarray, end_idx: np.ndarray):
+    """
+    Sums and cross sums of the prices over several windows of days, obtained from prefix sums.
+    Prices are centred on their mean beforehand, so that the variance computed from these sums does not lose precision.
+    
+    Args:
+        prices (np.ndarray):
+            Matrix days x assets with the prices of each asset.
+        purchase_idx (np.ndarray):
+            First day (row) of each window.
+        end_idx (np.ndarray):
+            Last day (row, included) of each window.
+    Returns:
+        tuple with the centre of the prices (one per asset), the sums (windows x assets) and the cross sums (windows x assets x assets) of the centred prices.
+    """
+    
+    centre = prices.mean(axis=0)
+    centred = prices - centre
+    prefix_sums = np.vstack([np.zeros((1, prices.shape[1])), np.cumsum(centred, axis=0)])
+    # Prefix cross sums are only accumulated up to the bounds of the windows (one matrix product per segment between bounds).
+    bounds = np.unique(np.concatenate([purchase_idx, end_idx + 1]))
+    prefix_cross = np.empty((len(bounds), prices.shape[1], prices.shape[1]))
+    accumulated, previous = np.zeros((prices.shape[1], prices.shape[1])), 0
+    for idx, bound in enumerate(bounds):
+        accumulated = accumulated + centred[previous:bound].T @ centred[previous:bound]
+        prefix_cross[idx], previous = accumulated, bound
+    
+    window_sums = prefix_sums[end_idx + 1] - prefix_sums[purchase_idx]
+    window_cross = prefix_cross[np.searchsorted(bounds, end_idx + 1)] - prefix_cross[np.searchsorted(bounds, purchase_idx)]
+    
+    return centre, window_sums, window_cross
+
+
+def _backtest_metrics(weights: np.ndarray, prices: np.ndarray, purchase_idx: np.ndarray, end_idx: np.ndarray, centre: np.ndarray, window_sums: np.ndarray, window_cross: np.ndarray):
+    """
+    Compute RETURN and VOLAT of a block of portfolios for several windows of days without going through the days of each window.
+    
+    Args:
+        weights (np.ndarray):
+            Matrix portfolios x assets with the percentage invested in each asset.
+        prices (np.ndarray):
+            Matrix days x assets with the prices of each asset.
+        purchase_idx (np.ndarray):
+            First day (row) of each window.
+        end_idx (np.ndarray):
+            Last day (row, included) of each window.
+        centre, window_sums, window_cross (np.ndarray):
+            The output of _window_price_sums() for these windows.
+    Returns:
+        tuple with two np.ndarray (RETURN, VOLAT) of shape portfolios x windows, rounded to 3 decimals.
+    """
+    
+    money_invested = 10000 # This value really does not matter.
+    num_days = (end_idx - purchase_idx + 1).astype(np.float64)
+    # Number of shares bought of each asset per unit of weight, for each window (windows x assets).
+    shares_per_weight = (money_invested/100)/prices[purchase_idx]
+    # RETURN.
+    buy_amount = weights @ (shares_per_weight*prices[purchase_idx]).T
+    current_value = weights @ (shares_per_weight*prices[end_idx]).T
+    # VOLATILITY: mean and variance of the value of the portfolios from the (centred) sums of the window.
+    sum_dev = weights @ (shares_per_weight*window_sums).T
+    sample_avg = sum_dev/num_days + weights @ (shares_per_weight*centre).T
+    cross = window_cross*shares_per_weight[:, :, None]*shares_per_weight[:, None, :]
+    sum_sq_dev = np.einsum("pa,wab,pb->pw", weights, cross, weights, optimize=True)
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # The sample variance of a window of one day is undefined (NaN, as in _portfolio_metrics()), not 0/0 rounded up to a positive number.
+        variance = np.where(num_days >= 2, np.maximum(sum_sq_dev - sum_dev**2/num_days, 0)/(num_days - 1), np.nan)
+        portfolio_return = np.round(((current_value-buy_amount)/buy_amount)*100, 3)
+        portfolio_volat = np.round((np.sqrt(variance)/sample_avg)*100, 3)
+    
+    return portfolio_return, portfolio_volat
+
+
+def pareto_front(risk: np.ndarray, returns: np.ndarray):
+    """
+    Obtain the efficient (Pareto-optimal) portfolios: no other portfolio has lower risk and higher return. Sort-and-sweep, O(n log n).
+    
+    Args:
+        risk (np.ndarray):
+            Risk (e.g. VOLAT) of each portfolio, to minimize.
+        returns (np.ndarray):
+            Return (e.g. RETURN) of each portfolio, to maximize.
+    Returns:
+        np.ndarray with the positions of the efficient portfolios sorted by risk (NaN values are ignored).
+    """
+    
+    valid = np.flatnonzero(~(np.isnan(risk) | np.isnan(returns)))
+    # Sorted by risk (ascending) and return (descending); a portfolio is efficient if its return beats every less risky one.
+    order = valid[np.lexsort((-returns[valid], risk[valid]))]
+    sorted_returns = returns[order]
+    best_before = np.concatenate([[-np.inf], np.maximum.accumulate(sorted_returns)[:-1]])
+    
+    return order[sorted_returns > best_before]
+
+
+def load_portfolio_metrics(path_to_npy_file: str):
+    """
+    Open a portfolio_metrics.npy file memory-mapped: only the rows that are used are read from disk.
+    
+    Args:
+        path_to_npy_file (str):
+            A string indicating the path to portfolio_metrics.npy.
+    Returns:
+        np.memmap structured array with one field per asset (uint8 percentages, float32 for sampled allocations) and the float32 fields "RETURN" and "VOLAT".
+    """
+    
+    # Parameter checking.
+    try:
+        assert os.path.isfile(path_to_npy_file), f"\033[1m ERROR: \033[0m The path to the npy file ({path_to_npy_file}) is not valid."
+    except AssertionError as error:
+        print(error)
+        exit(1)
+    
+    return np.load(path_to_npy_file, mmap_mode="r")
+
+
+def metrics_to_dataframe(metrics: np.ndarray):
+    """
+    Convert rows of portfolio_metrics.npy into the pd.DataFrame of portfolio_metrics.csv (same columns and values).
+    
+    Args:
+        metrics (np.ndarray):
+            Structured array with the rows (e.g. a slice of load_portfolio_metrics()).
+    Returns:
+        pd.DataFrame object with the allocations and their RETURN and VOLAT columns.
+    """
+    
+    df = pd.DataFrame({name: metrics[name] if metrics.dtype[name].kind != "u" else metrics[name].astype(np.int64) for name in metrics.dtype.names})
+    # float32 metrics back to the values rounded to 3 decimals.
+    for col in ["RETURN", "VOLAT"]: df[col] = np.round(df[col].astype(np.float64), 3)
+    
+    return df
+
+
+def query_portfolio_metrics(path_to_npy_file: str, min_return: float=None, max_return: float=None, min_volat: float=None, max_volat: float=None, weights: dict=None, condition=None, chunk_size: int=1000000):
+    """
+    Select the portfolios of portfolio_metrics.npy that meet some conditions, reading it block by block (only the selected rows are kept in memory).
+    
+    Args:
+        path_to_npy_file (str):
+            A string indicating the path to portfolio_metrics.npy.
+        min_return (float):
+            Minimum RETURN (included). By default = None.
+        max_return (float):
+            Maximum RETURN (included). By default = None.
+        min_volat (float):
+            Minimum VOLAT (included). By default = None.
+        max_volat (float):
+            Maximum VOLAT (included). By default = None.
+        weights (dict):
+            Percentage of some assets, either a value (e.g. {"GO": 40}) or a (minimum, maximum) tuple (e.g. {"ST": (20, 60)}). By default = None.
+        condition (function):
+            Function that receives a block of rows (structured array) and returns a boolean mask, for other conditions. By default = None.
+        chunk_size (int):
+            Number of rows read at a time. By default = 1000000.
+    Returns:
+        pd.DataFrame object with the selected portfolios (their position in the file as index).
+    """
+    
+    metrics = load_portfolio_metrics(path_to_npy_file)
+    bounds = [("RETURN", min_return, max_return), ("VOLAT", min_volat, max_volat)]
+    for asset, value in (weights or {}).items():
+        bounds.append((asset, *(value if isinstance(value, (tuple, list)) else (value, value))))
+    
+    selected, positions = [], []
+    for start in range(0, len(metrics), chunk_size):
+        block = metrics[start:start + chunk_size]
+        mask = np.ones(len(block), dtype=bool)
+        for col, low, high in bounds:
+            # float32 values are compared with the bounds rounded to the same precision.
+            if low is not None: mask &= block[col] >= np.array(low, dtype=block.dtype[col])
+            if high is not None: mask &= block[col] <= np.array(high, dtype=block.dtype[col])
+        if condition is not None: mask &= condition(block)
+        selected.append(np.asarray(block[mask]))
+        positions.append(np.flatnonzero(mask) + start)
+    
+    df = metrics_to_dataframe(np.concatenate(selected) if selected else np.asarray(metrics[:0]))
+    df.index = np.concatenate(positions) if positions else np.empty(0, dtype=np.int64)
+    
+    return df
+
+
+def export_portfolio_metrics_csv(path_to_npy_file: str, path_to_csv_file: str=None, chunk_size: int=1000000):
+    """
+    Write portfolio_metrics.npy as portfolio_metrics.csv (the same file that generate_portfolio_metrics_csv() creates), block by block.
+    
+    Args:
+        path_to_npy_file (str):
+            A string indicating the path to portfolio_metrics.npy.
+        path_to_csv_file (str):
+            A string indicating the path to the csv file. By default = None (same path with .csv extension).
+        chunk_size (int):
+            Number of rows written at a time. By default = 1000000.
+    Returns:
+        str with the path to the csv file.
+    """
+    
+    metrics = load_portfolio_metrics(path_to_npy_file)
+    path_to_csv_file = os.path.splitext(path_to_npy_file)[0] + ".csv" if path_to_csv_file is None else path_to_csv_file
+    for idx, start in enumerate(range(0, max(len(metrics), 1), chunk_size)):
+        metrics_to_dataframe(np.asarray(metrics[start:start + chunk_size])).to_csv(path_or_buf=path_to_csv_file, index=0, mode="w" if idx == 0 else "a", header=idx == 0)
+    
+    return path_to_csv_file
+
+
+def _nonnegative_qp(quad: np.ndarray, eq_matrix: np.ndarray, eq_values: np.ndarray, start: np.ndarray, max_iter: int=1000):
+    """
+    Minimize 1/2 y'Qy subject to Ay = b and y >= 0 (convex quadratic program) with a primal active-set method.
+    
+    Args:
+        quad (np.ndarray):
+            Positive semidefinite matrix Q (n x n).
+        eq_matrix (np.ndarray):
+            Matrix A of the equality constraints (m x n).
+        eq_values (np.ndarray):
+            Vector b of the equality constraints (m).
+        start (np.ndarray):
+            A feasible point (Ay = b, y >= 0).
+        max_iter (int):
+            Maximum number of iterations. By default = 1000.
+    Returns:
+        np.ndarray with the optimal y.
+    """
+    
+    y = start.astype(np.float64).copy()
+    free = y > 0
+    for _ in range(max_iter):
+        free_idx = np.flatnonzero(free)
+        num_free, num_eq = len(free_idx), eq_matrix.shape[0]
+        # Equality-constrained step on the free variables (KKT system).
+        kkt = np.zeros((num_free + num_eq, num_free + num_eq))
+        kkt[:num_free, :num_free] = quad[np.ix_(free_idx, free_idx)]
+        kkt[:num_free, num_free:] = eq_matrix[:, free_idx].T
+        kkt[num_free:, :num_free] = eq_matrix[:, free_idx]
+        solution = np.linalg.lstsq(kkt, np.concatenate([-(quad @ y)[free_idx], np.zeros(num_eq)]), rcond=None)[0]
+        step, multipliers = solution[:num_free], solution[num_free:]
+        
+        if np.abs(step).max(initial=0) <= 1e-12*max(1.0, np.abs(y).max()):
+            # Optimal if no bound y_i >= 0 of the fixed variables has a negative multiplier; otherwise the most negative one is released.
+            bound_multipliers = quad @ y + eq_matrix.T @ multipliers
+            fixed_idx = np.flatnonzero(~free)
+            if len(fixed_idx) == 0 or bound_multipliers[fixed_idx].min() >= -1e-12: return y
+            free[fixed_idx[np.argmin(bound_multipliers[fixed_idx])]] = True
+            continue
+        
+        # Longest step (up to 1) that keeps the free variables nonnegative; the blocking variable is fixed at 0.
+        with np.errstate(divide="ignore"):
+            ratios = np.where(step < 0, -y[free_idx]/step, np.inf)
+        blocking = np.argmin(ratios)
+        y[free_idx] += min(1.0, ratios[blocking])*step
+        if ratios[blocking] < 1.0:
+            y[free_idx[blocking]] = 0.0
+            free[free_idx[blocking]] = False
+    
+    return y
+
+
+def _round_to_lattice(weights: np.ndarray, units: int):
+    """
+    Round allocations (fractions that add up to 1) to multiples of 1/units that still add up to 1 (largest remainder method).
+    
+    Args:
+        weights (np.ndarray):
+            Matrix portfolios x assets with the fraction invested in each asset.
+        units (int):
+            Number of weight units of a portfolio (100/resolution).
+    Returns:
+        np.ndarray (int) with the number of units of each asset.
+    """
+    
+    scaled = weights*units
+    rounded = np.floor(scaled).astype(np.int64)
+    missing = units - rounded.sum(axis=1)
+    # The units left are given to the assets with the largest remainders.
+    ranks = np.argsort(np.argsort(-(scaled - rounded), axis=1, kind="stable"), axis=1)
+    
+    return rounded + (ranks < missing[:, None])
+
+
+def _init_metrics_worker(shm_name: str, shape: tuple, purchase_prices: np.ndarray, current_prices: np.ndarray, metrics: tuple=(), periods_per_year: int=365):
+    """
+    Initialize a worker of the process pool: attach (without copying) the price matrix stored in shared memory.
+    
+    Args:
+        shm_name (str):
+            Name of the shared memory block that contains the price matrix.
+        shape (tuple):
+            Shape (assets, days) of the price matrix.
+        purchase_prices (np.ndarray):
+            Vector with the price of each asset on the purchase date.
+        current_prices (np.ndarray):
+            Vector with the price of each asset on the last date.
+        metrics (tuple):
+            Names of other metrics of METRIC_REGISTRY (the metrics registered by the user are only available with the "fork" start method). By default = ().
+        periods_per_year (int):
+            Number of days in a year, to annualize the metrics. By default = 365.
+    """
+    
+    global _worker_inputs
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_inputs = (shm, purchase_prices, current_prices, np.ndarray(shape, dtype=np.float64, buffer=shm.buf), metrics, periods_per_year)
+    
+    
+def _metrics_worker(weights: np.ndarray):
+    """
+    Compute RETURN and VOLAT for a block of portfolios inside a worker of the process pool.
+    
+    Args:
+        weights (np.ndarray):
+            Matrix portfolios x assets with the percentage invested in each asset.
+    Returns:
+        tuple with the np.ndarray (RETURN, VOLAT and the other metrics) of one value per portfolio.
+    """
+    
+    _, purchase_prices, current_prices, prices, metrics, periods_per_year = _worker_inputs
+    return _portfolio_metrics(weights, purchase_prices, current_prices, prices, metrics, periods_per_year)
+
+
+def _check_date(date: str):
+    """
+    Check that a date has the format YYYY-MM-DD and exists.
+    
+    Args:
+        date (str):
+            A string representing the date.
+    Returns:
+        pd.Timestamp object of the date. An AssertionError is raised if the date is not valid.
+    """
+    
+    assert re.fullmatch(r"[0-9]{4}-[0-9]{2}-[0-9]{2}", str(date)) != None, f"\033[1m ERROR: \033[0m The date format is not correct ({date}), the format must be the following: YYYY-MM-DD"
+    try:
+        return pd.Timestamp(date)
+    except ValueError:
+        raise AssertionError(f"\033[1m ERROR: \033[0m The introduced date ({date}) does not exist.")
+
+
+# Longest run of days without prices (weekends and holidays) at the start or the end of the dates selected that is filled; longer ones are missing prices.
+MAX_UNOBSERVED_DAYS = 5
 
 
 class Portfolio():
     """
     This class allows to create a portfolio and also clean datasets from web scraping part.
     """
-    def __init__(self, folder_path: str, assets: str, increment_decrement: float=20.0):
+    def __init__(self, folder_path: str, assets: str, increment_decrement: float=20.0, start_date: str="2020-01-01", end_date: str="2020-12-31", fill_method: str="ffill", asset_registry: AssetRegistry=None, max_assets_per_portfolio: int=None, sampling: str=None, num_samples: int=10000, seed: int=0, dirichlet_alpha: float=1.0):
         """
         Init Portfolio. Sets the increase/decrease of the portfolio and the assets from which I want to create the portfolio. 
         
@@ -25,61 +806,164 @@ class Portfolio():
                 A string that contains the acronyms of the different assets from which the portfolio is to be created.
             increment_decrement (float): 
                 A float that represent the increase/decrease of the portfolio. By default = 20.0 (see exercise statement).
+            start_date (str):
+                First date (YYYY-MM-DD) of the price series. By default = "2020-01-01" (see exercise statement).
+            end_date (str):
+                Last date (YYYY-MM-DD) of the price series, used as the selling date of the portfolios. By default = "2020-12-31" (see exercise statement).
+            fill_method (str):
+                How the dates without prices are filled. It can take one of the following values:
+                 - "ffill" calendar days, the last known price is carried forward (default).
+                 - "bday" business days, the last known price is carried forward over holidays.
+                 - "mean" calendar days, the average of each column is inserted (exercise statement).
+                The dates before the first price or after the last price of an asset (beyond MAX_UNOBSERVED_DAYS non-trading days) are not filled, the metrics only use the dates with prices of all the assets.
+            asset_registry (AssetRegistry):
+                The registry with the available assets. By default = None (asset_registry/assets.json).
+            max_assets_per_portfolio (int):
+                Maximum number of assets with weight in each allocation (sparse grid, for many assets). By default = None (no limit).
+            sampling (str):
+                How the allocations are generated. It can take one of the following values:
+                 - None every allocation of the grid of increment_decrement steps (default).
+                 - "dirichlet" num_samples random allocations from a Dirichlet distribution.
+                 - "halton" num_samples allocations from the Halton low-discrepancy sequence, which covers the simplex more evenly than random ones.
+            num_samples (int):
+                Number of allocations generated with sampling. By default = 10000.
+            seed (int):
+                Seed of the sampling, the same seed gives the same allocations. By default = 0.
+            dirichlet_alpha (float):
+                Concentration of the Dirichlet distribution (1 uniform on the simplex, <1 allocations with few assets, >1 balanced allocations). By default = 1.0.
         """
         
         self.folder_path = folder_path
         if os.path.isdir(self.folder_path) == False: os.mkdir(self.folder_path)
         self.increment_decrement = increment_decrement 
-        available_assets = ["ST", "CB", "PB", "GO", "CA"]
+        self.asset_registry = DEFAULT_ASSET_REGISTRY if asset_registry is None else asset_registry
+        self.max_assets_per_portfolio = max_assets_per_portfolio
+        self.sampling, self.num_samples, self.seed, self.dirichlet_alpha = sampling, num_samples, seed, dirichlet_alpha
+        available_assets = self.asset_registry.acronyms
         param_list_assets = list(assets.split(" "))
         unique_assets = list(set([asset for asset in param_list_assets if asset in available_assets]))
         self.assets = [asset for asset in available_assets if asset in unique_assets]
+        self.fill_method = fill_method
         # Parameter checking.
         try:
             assert increment_decrement > 0 and increment_decrement < 101, "\033[1m ERROR: \033[0m Increment/decrement value must be higher than 1 and less than 101"
             assert len(self.assets) >= 1, f"\033[1m ERROR: \033[0m At least on of the assets selected ({assets}) are not available."
+            self.start_date, self.end_date = _check_date(start_date), _check_date(end_date)
+            assert self.start_date <= self.end_date, f"\033[1m ERROR: \033[0m The start date ({start_date}) must be before the end date ({end_date})."
+            assert fill_method in ["ffill", "bday", "mean"], f"\033[1m ERROR: \033[0m Fill method '{fill_method}' not available, it must be 'ffill', 'bday' or 'mean'."
+            assert max_assets_per_portfolio is None or max_assets_per_portfolio >= 1, "\033[1m ERROR: \033[0m The maximum number of assets per portfolio must be at least 1."
+            assert sampling in [None, "dirichlet", "halton"], f"\033[1m ERROR: \033[0m Sampling method '{sampling}' not available, it must be None, 'dirichlet' or 'halton'."
+            assert num_samples >= 0 and dirichlet_alpha > 0, "\033[1m ERROR: \033[0m The number of samples must be positive and the Dirichlet concentration higher than 0."
         except AssertionError as error:
             print(error)
             exit(1)
             
         
-    def generate_portfolio_allocations_csv(self):
+    @profiled(rows=len)
+    def generate_portfolio_allocations_csv(self, chunk_size: int=None):
         """
         Create portfolio allocations in the route specified in folder_path parameter and returns it as pd.DataFrame object.
         
         Args:
-            folder_path (str): 
-                A string indicating the path to the folder where the csv file is to be saved.
+            chunk_size (int):
+                Number of allocations written at a time. By default = None (all the allocations are kept in memory and returned).
         Returns:
-            pd.DataFrame object which is the portfolio allocations.
+            pd.DataFrame object which is the portfolio allocations (None if chunk_size is given).
         """
         
-        weights = list(range(0, 101, self.increment_decrement))
-        generate_portfolios = sorted(product(weights, repeat=len(self.assets)), reverse=True)
-        portfolio_allocations = pd.DataFrame([portfolio for portfolio in list(generate_portfolios) if sum(portfolio) == 100], columns=self.assets)
+        if chunk_size is not None:
+            for idx, block in enumerate(self.iter_portfolio_allocations(chunk_size=chunk_size)):
+                add_rows(len(block))
+                block.to_csv(path_or_buf= self.folder_path + "/portfolio_allocations.csv", index=False, mode="w" if idx == 0 else "a", header=idx == 0)
+            return None
         
+        portfolio_allocations = next(self.iter_portfolio_allocations(chunk_size=None))
         portfolio_allocations.to_csv(path_or_buf= self.folder_path + "/portfolio_allocations.csv", index=False)
         
         return portfolio_allocations
         
         
-    def treat_csv_files(self, web_scraping_csv_folder_path: str):
+    def iter_portfolio_allocations(self, chunk_size: int=None):
+        """
+        Generate the portfolio allocations in blocks of fixed size, so that they never have to be all in memory at once.
+        
+        Args:
+            chunk_size (int):
+                Number of allocations of each block. By default = None (a single block with all the allocations).
+        Returns:
+            generator of pd.DataFrame objects with the portfolio allocations in descending order (in generation order with sampling).
+        """
+        
+        if self.sampling is not None:
+            yield from self._iter_sampled_allocations(chunk_size)
+            return
+        # Only the allocations whose weights add up to 100 are generated (same descending order as sorting the whole Cartesian product).
+        step = int(self.increment_decrement)
+        if 100 % step != 0:
+            yield pd.DataFrame(np.empty((0, len(self.assets)), dtype=np.int64), columns=self.assets)
+            return
+        units = 100 // step
+        total = self._num_allocations()
+        # Parameter checking.
+        try:
+            assert total < 2**62, f"\033[1m ERROR: \033[0m There are too many allocations ({total}), use a bigger increment/decrement or a maximum number of assets per portfolio."
+        except AssertionError as error:
+            print(error)
+            exit(1)
+        chunk_size = total if chunk_size is None else chunk_size
+        for start in range(0, max(total, 1), max(chunk_size, 1)):
+            if self.max_assets_per_portfolio is not None and self.max_assets_per_portfolio < len(self.assets):
+                # Sparse grid: only the allocations with at most max_assets_per_portfolio assets.
+                lattice = _sparse_simplex_lattice(units, len(self.assets), self.max_assets_per_portfolio, start, start + chunk_size)
+            else:
+                lattice = _simplex_lattice(units, len(self.assets), start, start + chunk_size)
+            yield pd.DataFrame(lattice * step, columns=self.assets)
+        
+        
+    def _iter_sampled_allocations(self, chunk_size: int=None):
+        """
+        Generate num_samples allocations (percentages that add up to 100) with the sampling method, in blocks of fixed size.
+        The blocks do not change the allocations: the Dirichlet draws are taken one after another from the same generator and the Halton points are built from their index.
+        
+        Args:
+            chunk_size (int):
+                Number of allocations of each block. By default = None (a single block with all the allocations).
+        Returns:
+            generator of pd.DataFrame objects with the portfolio allocations.
+        """
+        
+        rng = np.random.default_rng(self.seed)
+        # Random shift of the Halton points (the same seed gives the same points).
+        shift = rng.random(len(self.assets) - 1)
+        chunk_size = max(self.num_samples, 1) if chunk_size is None else chunk_size
+        for start in range(0, max(self.num_samples, 1), max(chunk_size, 1)):
+            stop = min(start + chunk_size, self.num_samples)
+            if self.sampling == "dirichlet":
+                gammas = rng.standard_gamma(self.dirichlet_alpha, size=(stop - start, len(self.assets)))
+                weights = gammas/gammas.sum(axis=1, keepdims=True)
+            else:
+                weights = _cube_to_simplex((_halton(start, stop, len(self.assets) - 1) + shift) % 1.0)
+            yield pd.DataFrame(weights*100, columns=self.assets)
+        
+        
+    @profiled(rows=lambda csvs_treated: sum(len(df) for df in csvs_treated.values()))
+    def treat_csv_files(self, web_scraping_csv_folder_path: str, cache_folder_path: str=None):
         """
         Treat the csv files from web scraping part stored in folder_path route.
         
         Args:
             web_scraping_csv_folder_path (str): 
                 A string indicating the path where are the csv files from web scraping part.
+            cache_folder_path (str):
+                A string indicating the folder where the treated csv files are cached (.npy files). By default = None (no cache).
         Returns:
             dict: 
                 - Key: the acronyms of the different assets.
-                - Value: a pd.DataFrame object which is the processed csv corresponding to the asset.
+                - Value: a pd.DataFrame object which is the processed csv corresponding to the asset, indexed by a sorted DatetimeIndex ("Date").
         """
         
         # We see if exists the web scraping csv files hat we want to treat from the assets that we want to create the portfolio.
-        asset_csv_names = {"ST":"amundi-msci-wrld-ae-c.csv", "CB":"ishares-global-corporate-bond-$.csv", "PB":"db-x-trackers-ii-global-sovereign-5.csv", "GO":"spdr-gold-trust.csv", "CA":"usdollar.csv"}
-        remove_keys = [asset for asset in asset_csv_names.keys() if asset not in self.assets]
-        for asset in remove_keys: del asset_csv_names[asset] 
+        asset_csv_names = {asset: self.asset_registry.get(asset)["csv_name"] for asset in self.assets}
         path_csvs_availables = [web_scraping_csv_folder_path + "/" + csv_name for csv_name in asset_csv_names.values() if os.path.exists(web_scraping_csv_folder_path + "/" + csv_name)] 
         
         # Parameter checking.
@@ -89,109 +973,666 @@ class Portfolio():
             print(error)
             exit(1)
         
-        csvs_treated = {}
-        type_asset_index = 0
-        # Modify each csv file if it exist.
-        for csv_file in path_csvs_availables:
-    
-            df = pd.read_csv(csv_file)
-            # Date to str.
-            df["Date"] = pd.to_datetime(df["Date"])
-            df["Date"] = df["Date"].dt.date
-            df["Date"] = df["Date"].apply(lambda x: str(x))
-            # Col name changed and % character deleted.
-            df = df.rename(columns={"Change %": "Change"})
-            df["Change"] = pd.to_numeric(df["Change"].apply(lambda x: x.replace("%", "")))
-            # Missing dates
-            missing_dates = pd.date_range(start='2020-01-01', end='2020-12-31').difference(df["Date"])
-            missing_dates_df = pd.DataFrame(missing_dates.strftime('%Y-%m-%d'), columns=["Date"])
-            # For new dates, columns "Price" and "Change" are assigned the average of each column.
-            avg_price = df["Price"].mean()
-            missing_dates_df["Price"] = round(avg_price, 2)
-            avg_change = df["Change"].mean()
-            missing_dates_df["Change"] = round(avg_change, 2)
-            # If "Vol." column in pd.DataFrame then replace "K" (1e+3), "M" (1e+6) and "-" characters by mean of the column. The missing date rows the same.
-            if "Vol." in df.columns:
-                df = df.rename(columns={"Vol.": "Vol"})
-                units_val = {"K":1e+3, "M":1e+6}
-                    
-                for unit, val in units_val.items():
-                    if "Vol" in df.columns and df["Vol"].dtype == "O" and df["Vol"].str.contains(unit).any():
-                        if df["Vol"].str.contains("-").any():
-                            df["Vol"] = df["Vol"].apply(lambda x: pd.to_numeric(x.replace(unit, ""))*val if unit in x else np.nan)
-                            avg_vol = round(df["Vol"][~np.isnan(df["Vol"])].mean(), 3)
-                            df["Vol"] = df["Vol"].fillna(avg_vol)
-                            missing_dates_df["Vol"] = avg_vol
-                        else:
-                            df["Vol"] = df["Vol"].apply(lambda x: pd.to_numeric(x.replace(unit, ""))*val)
-                            avg_vol = round(df["Vol"].mean(), 3)
-                            missing_dates_df["Vol"] = avg_vol
-                      
-            complete_dataframe = pd.concat([missing_dates_df, df], ignore_index=True).sort_values(by="Date").reset_index(drop=True).dropna(axis=1)
-            csvs_treated[self.assets[type_asset_index]] = complete_dataframe
-            type_asset_index += 1
+        if cache_folder_path is None:
+            csvs_treated = {asset: self._clean_csv_file(web_scraping_csv_folder_path + "/" + csv_name) for asset, csv_name in asset_csv_names.items()}
+        else:
+            if os.path.isdir(cache_folder_path) == False: os.makedirs(cache_folder_path)
+            csvs_treated = {asset: self._cached_clean_csv_file(web_scraping_csv_folder_path + "/" + csv_name, cache_folder_path) for asset, csv_name in asset_csv_names.items()}
             
         return csvs_treated
 
 
-    def generate_portfolio_metrics_csv(self, treat_csv_files: dict, portfolio_allocations: pd.DataFrame, purchase_date: str="2020-01-01"):
+    @profiled(rows=len)
+    def _clean_csv_file(self, csv_file: str):
         """
-        Create portfolio metrics in folder_path route.
+        Clean one csv file from web scraping part with column-wise (vectorized) operations.
+        
+        Args:
+            csv_file (str):
+                A string indicating the path to the csv file.
+        Returns:
+            pd.DataFrame object indexed by date (datetime64) with the columns "Price", "Change" and "Vol" (if available).
+        """
+        
+        df = pd.read_csv(csv_file, thousands=",")
+        # Dates as a sorted datetime64 index (investing.com format "Dec 31, 2020" is parsed without per-row inference).
+        dates = df.pop("Date")
+        try:
+            dates = pd.to_datetime(dates, format="%b %d, %Y")
+        except ValueError:
+            dates = pd.to_datetime(dates)
+        df.index = pd.DatetimeIndex(dates.dt.normalize(), name="Date")
+        df = df[~df.index.duplicated()].sort_index()
+        # Col name changed and % character deleted.
+        df = df.rename(columns={"Change %": "Change", "Vol.": "Vol"})
+        df["Change"] = pd.to_numeric(df["Change"].astype(str).str.rstrip("%"), errors="coerce")
+        # "K" (1e+3) and "M" (1e+6) suffixes of "Vol" column are applied and "-" becomes NaN.
+        fill_values = {"Price": round(df["Price"].mean(), 2), "Change": round(df["Change"].mean(), 2)}
+        if "Vol" in df.columns:
+            vol = df["Vol"].astype(str).str.strip().str.extract(r"^([0-9.]+)([KMB]?)$")
+            df["Vol"] = pd.to_numeric(vol[0], errors="coerce")*vol[1].map({"": 1.0, "K": 1e+3, "M": 1e+6, "B": 1e+9})
+            fill_values["Vol"] = round(df["Vol"].mean(), 3)
+        # Missing dates of the calendar (calendar days or business days) between start_date and end_date.
+        calendar = pd.date_range(start=self.start_date, end=self.end_date, freq="B" if self.fill_method == "bday" else "D", name="Date")
+        # Prices are not made up out of the prices of the csv file: only the non-trading days (up to MAX_UNOBSERVED_DAYS) between the edges of the dates selected and the prices are filled.
+        if len(df):
+            first_date = self.start_date if df.index[0] - self.start_date <= pd.Timedelta(days=MAX_UNOBSERVED_DAYS) else df.index[0]
+            last_date = self.end_date if self.end_date - df.index[-1] <= pd.Timedelta(days=MAX_UNOBSERVED_DAYS) else df.index[-1]
+            calendar = calendar[(calendar >= first_date) & (calendar <= last_date)]
+        if self.fill_method == "mean":
+            # Columns are assigned the average of each column.
+            df = df.reindex(calendar).fillna(fill_values)
+        else:
+            # The last known price is carried forward, without price change nor volume. The dates before the first price are not filled.
+            inserted_dates = df.index.union(calendar).difference(df.index)
+            df = df.reindex(df.index.union(calendar))
+            df["Price"] = df["Price"].ffill()
+            df.loc[inserted_dates, [col for col in ["Change", "Vol"] if col in df.columns]] = 0.0
+            df = df.fillna(fill_values).reindex(calendar[calendar >= df["Price"].first_valid_index()] if len(df) else calendar)
+        
+        return df[[col for col in ["Price", "Change", "Vol"] if col in df.columns]].dropna(axis=1)
+    
+    
+    @profiled(rows=len)
+    def build_price_panel(self, treat_csv_files: dict):
+        """
+        Align the prices of the treated csv files in a single panel shared by the metrics computations.
         
         Args:
             treat_csv_files (dict):
                 A dictionary in wich the key is the acronym of the asset and the value the treat csv in pd.DataFrame format.
+        Returns:
+            pd.DataFrame object (float64) with one row per date (sorted DatetimeIndex) and one column per asset.
+        """
+        
+        price_panel = pd.concat([treat_csv_files[asset]["Price"].rename(asset) for asset in self.assets], axis=1, join="inner").astype(np.float64)
+        for asset in self.assets:
+            dates = treat_csv_files[asset].index
+            if len(dates) == 0 or dates[0] > self.start_date + pd.Timedelta(days=MAX_UNOBSERVED_DAYS) or dates[-1] < self.end_date - pd.Timedelta(days=MAX_UNOBSERVED_DAYS):
+                print(f"\033[1m WARNING: \033[0m The prices of {asset} do not cover the dates selected ({self.start_date.date()} to {self.end_date.date()}), " + (f"they go from {dates[0].date()} to {dates[-1].date()}. " if len(dates) else "there are none. ") + (f"The metrics only use the dates from {price_panel.index.min().date()} to {price_panel.index.max().date()}." if len(price_panel) else ""))
+        
+        return price_panel.sort_index()
+    
+    
+    def _cleaning_params(self):
+        """
+        Parameters that change the result of _clean_csv_file(). They are part of the cache key, so changing any of them invalidates the cache.
+        
+        Returns:
+            dict with the cleaning parameters.
+        """
+        
+        return {"version": 3, "start_date": str(self.start_date.date()), "end_date": str(self.end_date.date()), "fill_method": self.fill_method}
+    
+    
+    def _cached_clean_csv_file(self, csv_file: str, cache_folder_path: str):
+        """
+        Load the treated csv file from the cache (memory-mapped .npy files) or clean it and store it in the cache.
+        Each entry is a folder named "<csv name>.<hash of the csv file content>.<hash of the cleaning parameters>", with one row per column in values.npy (so each column is contiguous and the DataFrame is a view of the memory-mapped file, without copies), dates.npy and columns.json.
+        The entries of other cleaning parameters (e.g. other dates) are kept; only the entries of an older content of the csv file are removed.
+        
+        Args:
+            csv_file (str):
+                A string indicating the path to the csv file.
+            cache_folder_path (str):
+                A string indicating the folder where the treated csv files are cached.
+        Returns:
+            pd.DataFrame object, the same as _clean_csv_file() (read-only, backed by the memory-mapped cache).
+        """
+        
+        with open(csv_file, "rb") as f:
+            content_key = hashlib.sha1(f.read()).hexdigest()
+        params_key = hashlib.sha1(json.dumps(self._cleaning_params(), sort_keys=True).encode()).hexdigest()
+        csv_name = os.path.splitext(os.path.basename(csv_file))[0]
+        cache_entry = cache_folder_path + "/" + csv_name + "." + content_key + "." + params_key
+        
+        if not os.path.isdir(cache_entry):
+            df = self._clean_csv_file(csv_file)
+            # Written in a temporal folder and then renamed, so that a cache entry is never partially written.
+            tmp_entry = cache_entry + ".tmp" + str(os.getpid())
+            os.makedirs(tmp_entry, exist_ok=True)
+            np.save(tmp_entry + "/values.npy", np.ascontiguousarray(df.to_numpy(dtype=np.float64).T))
+            np.save(tmp_entry + "/dates.npy", df.index.to_numpy(dtype="datetime64[ns]"))
+            with open(tmp_entry + "/columns.json", "w", encoding="utf-8") as f:
+                json.dump(list(df.columns), f)
+            try:
+                os.rename(tmp_entry, cache_entry)
+            except OSError:
+                # Another process stored the same entry in the meantime.
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+            for stale_entry in glob.glob(glob.escape(cache_folder_path + "/" + csv_name) + ".*"):
+                key = stale_entry[len(cache_folder_path + "/" + csv_name) + 1:]
+                if re.fullmatch(r"[0-9a-f]{40}(\.[0-9a-f]{40})?(\.npy)?", key) and not key.startswith(content_key):
+                    shutil.rmtree(stale_entry) if os.path.isdir(stale_entry) else os.remove(stale_entry)
+        
+        values = np.load(cache_entry + "/values.npy", mmap_mode="r")
+        with open(cache_entry + "/columns.json", encoding="utf-8") as f:
+            columns = json.load(f)
+        
+        return pd.DataFrame(values.T, columns=columns, index=pd.DatetimeIndex(np.load(cache_entry + "/dates.npy"), name="Date"), copy=False)
+        
+        
+    @profiled()
+    def generate_portfolio_metrics_csv(self, price_panel: pd.DataFrame, portfolio_allocations: pd.DataFrame=None, purchase_date: str="2020-01-01", chunk_size: int=None, workers: int=1, metrics: list=None):
+        """
+        Create portfolio metrics in folder_path route.
+        
+        Args:
+            price_panel (pd.DataFrame):
+                The aligned price panel (dates x assets) obtained with build_price_panel().
+            portfolio_allocations (pd.DataFrame):
+                The portfolio allocations generated previously in pd.DataFrame format. By default = None (the allocations are taken from the enumerator, block by block).
+            purchase_date (str):
+                The date from which you want to calculate metrics. By default = "2020-01-01" (see exercise statement)
+            chunk_size (int):
+                Number of portfolios evaluated and appended to portfolio_metrics.csv at a time, which bounds the peak memory. By default = None (all at once).
+            workers (int):
+                Number of processes among which the portfolios are split. By default = 1 (no process pool).
+            metrics (list):
+                Names of other metrics of METRIC_REGISTRY (e.g. ["SHARPE", "MAX_DRAWDOWN", "VAR_95"]), added as columns after RETURN and VOLAT. They are computed in the same pass over the portfolio values. By default = None (only RETURN and VOLAT).
+        """
+        
+        if portfolio_allocations is not None and chunk_size is None:
+            # In-memory path: the metrics are added to the given allocations.
+            columns = ["RETURN", "VOLAT"] + self._check_metrics(metrics)
+            if workers > 1:
+                blocks = list(self.iter_portfolio_metrics(price_panel, portfolio_allocations, purchase_date, max(1, -(-len(portfolio_allocations) // (4*workers))), workers, metrics))
+                values = [np.concatenate([block[col] for block in blocks]) for col in columns]
+            else:
+                values = _portfolio_metrics(portfolio_allocations[self.assets].to_numpy(dtype=np.float64), *self._metrics_prices(price_panel, purchase_date), tuple(columns[2:]), self._periods_per_year())
+            add_rows(len(portfolio_allocations))
+            for col, value in zip(columns, values):
+                portfolio_allocations[col] = value
+            portfolio_allocations.to_csv(path_or_buf= self.folder_path + "/portfolio_metrics.csv", index=0)
+            return
+        
+        for idx, block in enumerate(self.iter_portfolio_metrics(price_panel, portfolio_allocations, purchase_date, chunk_size, workers, metrics)):
+            add_rows(len(block))
+            block.to_csv(path_or_buf= self.folder_path + "/portfolio_metrics.csv", index=0, mode="w" if idx == 0 else "a", header=idx == 0)
+            
+            
+    @profiled()
+    def generate_portfolio_metrics_npy(self, price_panel: pd.DataFrame, portfolio_allocations: pd.DataFrame=None, purchase_date: str="2020-01-01", chunk_size: int=100000, workers: int=1, metrics: list=None):
+        """
+        Create portfolio_metrics.npy in folder_path route: a structured array with uint8 percentages (float32 for sampled allocations) and float32 RETURN and VOLAT (13 bytes per portfolio with 5 assets), without text formatting.
+        The blocks are written in place in the memory-mapped file, so only chunk_size portfolios are in memory at a time. Read it with load_portfolio_metrics() or query_portfolio_metrics(), and export_portfolio_metrics_csv() writes the csv file.
+        
+        Args:
+            price_panel (pd.DataFrame):
+                The aligned price panel (dates x assets) obtained with build_price_panel().
+            portfolio_allocations (pd.DataFrame):
+                The portfolio allocations generated previously in pd.DataFrame format. By default = None (the allocations are taken from the enumerator, block by block).
+            purchase_date (str):
+                The date from which you want to calculate metrics. By default = "2020-01-01" (see exercise statement)
+            chunk_size (int):
+                Number of portfolios evaluated and written at a time. By default = 100000.
+            workers (int):
+                Number of processes among which the portfolios are split. By default = 1 (no process pool).
+            metrics (list):
+                Names of other metrics of METRIC_REGISTRY, added as float32 fields after RETURN and VOLAT. By default = None (only RETURN and VOLAT).
+        Returns:
+            str with the path to portfolio_metrics.npy.
+        """
+        
+        if portfolio_allocations is not None:
+            num_portfolios = len(portfolio_allocations)
+            weights = portfolio_allocations[self.assets].to_numpy()
+            integer_weights = bool(np.all((weights == np.round(weights)) & (weights >= 0) & (weights <= 255)))
+        else:
+            num_portfolios, integer_weights = self._num_allocations(), self.sampling is None
+        dtype = np.dtype([(asset, np.uint8 if integer_weights else np.float32) for asset in self.assets] + [(col, np.float32) for col in ["RETURN", "VOLAT"] + self._check_metrics(metrics)])
+        
+        path_to_npy_file = self.folder_path + "/portfolio_metrics.npy"
+        # Written in a temporal file and then renamed, so that a npy file is never partially written.
+        if num_portfolios == 0:
+            np.save(path_to_npy_file + ".tmp", np.empty(0, dtype=dtype))
+            os.replace(path_to_npy_file + ".tmp.npy", path_to_npy_file)
+            return path_to_npy_file
+        metrics_file = np.lib.format.open_memmap(path_to_npy_file + ".tmp", mode="w+", dtype=dtype, shape=(num_portfolios,))
+        position = 0
+        for block in self.iter_portfolio_metrics(price_panel, portfolio_allocations, purchase_date, chunk_size, workers, metrics):
+            add_rows(len(block))
+            for col in dtype.names:
+                metrics_file[col][position:position + len(block)] = block[col].to_numpy()
+            position += len(block)
+        metrics_file.flush()
+        del metrics_file
+        os.replace(path_to_npy_file + ".tmp", path_to_npy_file)
+        
+        return path_to_npy_file
+    
+    
+    def _check_metrics(self, metrics: list):
+        """
+        Check that the selected metrics are in the registry.
+        
+        Args:
+            metrics (list):
+                Names of metrics of METRIC_REGISTRY (None for no metrics).
+        Returns:
+            list with the names of the metrics.
+        """
+        
+        metrics = [] if metrics is None else list(metrics)
+        # Parameter checking.
+        try:
+            unknown_metrics = [name for name in metrics if name not in METRIC_REGISTRY or name in ["RETURN", "VOLAT"]]
+            assert not unknown_metrics, f"\033[1m ERROR: \033[0m Metric(s) {', '.join(unknown_metrics)} not available, they must be some of: {', '.join(METRIC_REGISTRY)}."
+        except AssertionError as error:
+            print(error)
+            exit(1)
+        
+        return metrics
+    
+    
+    def _periods_per_year(self):
+        """
+        Number of rows of the price panel in a year, to annualize the metrics.
+        
+        Returns:
+            int 252 for business days ("bday" fill method), 365 for calendar days.
+        """
+        
+        return 252 if self.fill_method == "bday" else 365
+    
+    
+    def _num_allocations(self):
+        """
+        Number of allocations that iter_portfolio_allocations() generates, without generating them.
+        
+        Returns:
+            int with the number of allocations.
+        """
+        
+        if self.sampling is not None: return self.num_samples
+        step = int(self.increment_decrement)
+        if 100 % step != 0: return 0
+        units, n_assets = 100 // step, len(self.assets)
+        if self.max_assets_per_portfolio is not None and self.max_assets_per_portfolio < n_assets:
+            # Allocations with exactly "size" assets: the combinations of assets times the splits of the units with at least one unit each.
+            return sum(comb(n_assets, size)*comb(units - 1, size - 1) for size in range(1, min(self.max_assets_per_portfolio, n_assets, units) + 1))
+        
+        return comb(units + n_assets - 1, n_assets - 1)
+            
+            
+    def iter_portfolio_metrics(self, price_panel: pd.DataFrame, portfolio_allocations: pd.DataFrame=None, purchase_date: str="2020-01-01", chunk_size: int=100000, workers: int=1, metrics: list=None):
+        """
+        Compute the portfolio metrics block by block, so that only chunk_size portfolios (and their daily values) are in memory at a time.
+        
+        Args:
+            price_panel (pd.DataFrame):
+                The aligned price panel (dates x assets) obtained with build_price_panel().
+            portfolio_allocations (pd.DataFrame):
+                The portfolio allocations generated previously in pd.DataFrame format. By default = None (the allocations are taken from the enumerator).
+            purchase_date (str):
+                The date from which you want to calculate metrics. By default = "2020-01-01" (see exercise statement)
+            chunk_size (int):
+                Number of portfolios of each block. By default = 100000.
+            workers (int):
+                Number of processes that evaluate the blocks in parallel. The price matrix is placed once in shared memory and the blocks are returned in their original order. By default = 1 (no process pool).
+            metrics (list):
+                Names of other metrics of METRIC_REGISTRY, added as columns after RETURN and VOLAT. By default = None (only RETURN and VOLAT).
+        Returns:
+            generator of pd.DataFrame objects with the allocations and their RETURN and VOLAT (and other metrics) columns.
+        """
+        
+        columns = ["RETURN", "VOLAT"] + self._check_metrics(metrics)
+        purchase_prices, current_prices, prices = self._metrics_prices(price_panel, purchase_date)
+        blocks = self._allocation_blocks(portfolio_allocations, chunk_size)
+        
+        if workers <= 1:
+            for block in blocks:
+                block = block.copy()
+                for col, value in zip(columns, _portfolio_metrics(block[self.assets].to_numpy(dtype=np.float64), purchase_prices, current_prices, prices, tuple(columns[2:]), self._periods_per_year())):
+                    block[col] = value
+                yield block
+            return
+        
+        shm = shared_memory.SharedMemory(create=True, size=max(prices.nbytes, 1))
+        try:
+            np.ndarray(prices.shape, dtype=np.float64, buffer=shm.buf)[:] = prices
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_metrics_worker, initargs=(shm.name, prices.shape, purchase_prices, current_prices, tuple(columns[2:]), self._periods_per_year())) as executor:
+                # At most 2 blocks per worker are in flight, so memory stays bounded and blocks are yielded in order.
+                pending = deque()
+                for block in blocks:
+                    pending.append((block.copy(), executor.submit(_metrics_worker, block[self.assets].to_numpy(dtype=np.float64))))
+                    while len(pending) >= 2*workers or (pending and pending[0][1].done()):
+                        block, future = pending.popleft()
+                        for col, value in zip(columns, future.result()):
+                            block[col] = value
+                        yield block
+                while pending:
+                    block, future = pending.popleft()
+                    for col, value in zip(columns, future.result()):
+                        block[col] = value
+                    yield block
+        finally:
+            shm.close()
+            shm.unlink()
+            
+            
+    @profiled()
+    def generate_portfolio_backtest_csv(self, price_panel: pd.DataFrame, purchase_dates: list, holding_periods: list=None, portfolio_allocations: pd.DataFrame=None, chunk_size: int=None):
+        """
+        Create portfolio_backtest.csv in folder_path route, with the metrics of every portfolio for every purchase date (and holding period).
+        
+        Args:
+            price_panel (pd.DataFrame):
+                The aligned price panel (dates x assets) obtained with build_price_panel().
+            purchase_dates (list):
+                The dates (YYYY-MM-DD strings, a pd.DatetimeIndex...) from which you want to calculate metrics.
+            holding_periods (list):
+                Numbers of calendar days the portfolios are held. By default = None (held until end_date).
             portfolio_allocations (pd.DataFrame):
-                The portfolio allocations generated previously in pd.DataFrame format.
+                The portfolio allocations generated previously in pd.DataFrame format. By default = None (the allocations are taken from the enumerator).
+            chunk_size (int):
+                Number of portfolios evaluated (for all the dates) and appended to portfolio_backtest.csv at a time. By default = None (all at once).
+        """
+        
+        for idx, block in enumerate(self.iter_portfolio_backtest(price_panel, purchase_dates, holding_periods, portfolio_allocations, chunk_size)):
+            add_rows(len(block))
+            block.to_csv(path_or_buf= self.folder_path + "/portfolio_backtest.csv", index=0, mode="w" if idx == 0 else "a", header=idx == 0)
+            
+            
+    def iter_portfolio_backtest(self, price_panel: pd.DataFrame, purchase_dates: list, holding_periods: list=None, portfolio_allocations: pd.DataFrame=None, chunk_size: int=100000):
+        """
+        Compute RETURN and VOLAT of every (allocation, purchase date, holding period) in one pass.
+        Sums and cross sums of the prices are accumulated once over the panel, so each extra date costs O(1) (in the number of days) per portfolio.
+        
+        Args:
+            price_panel (pd.DataFrame):
+                The aligned price panel (dates x assets) obtained with build_price_panel().
+            purchase_dates (list):
+                The dates (YYYY-MM-DD strings, a pd.DatetimeIndex...) from which you want to calculate metrics.
+            holding_periods (list):
+                Numbers of calendar days the portfolios are held. The windows that end after end_date are skipped. By default = None (held until end_date).
+            portfolio_allocations (pd.DataFrame):
+                The portfolio allocations generated previously in pd.DataFrame format. By default = None (the allocations are taken from the enumerator).
+            chunk_size (int):
+                Number of portfolios of each block. By default = 100000.
+        Returns:
+            generator of pd.DataFrame objects with the allocations and their PURCHASE_DATE, END_DATE, RETURN and VOLAT columns (one row per allocation and window).
+        """
+        
+        if isinstance(price_panel, dict): price_panel = self.build_price_panel(price_panel)
+        dates = price_panel.index
+        # Parameter checking.
+        try:
+            purchase_timestamps = pd.DatetimeIndex([_check_date(date) if isinstance(date, str) else pd.Timestamp(date) for date in purchase_dates])
+            assert len(purchase_timestamps) >= 1, "\033[1m ERROR: \033[0m At least one purchase date is needed."
+            assert ((purchase_timestamps >= self.start_date) & (purchase_timestamps <= self.end_date)).all(), f"\033[1m ERROR: \033[0m The purchase dates must be between {self.start_date.date()} and {self.end_date.date()}."
+            assert holding_periods is None or all(int(days) > 0 for days in holding_periods), "\033[1m ERROR: \033[0m The holding periods must be a positive number of days."
+        except AssertionError as error:
+            print(error)
+            exit(1)
+        
+        # Windows (first and last row of the panel) of each purchase date and holding period.
+        if holding_periods is None:
+            end_timestamps = pd.DatetimeIndex([self.end_date]*len(purchase_timestamps))
+        else:
+            end_timestamps = pd.DatetimeIndex([date + pd.Timedelta(days=int(days)) for date in purchase_timestamps for days in holding_periods])
+            purchase_timestamps = purchase_timestamps.repeat(len(holding_periods))
+            keep = end_timestamps <= self.end_date
+            purchase_timestamps, end_timestamps = purchase_timestamps[keep], end_timestamps[keep]
+        purchase_idx = dates.searchsorted(purchase_timestamps, side="left")
+        end_idx = dates.searchsorted(end_timestamps, side="right") - 1
+        keep = purchase_idx <= end_idx
+        purchase_idx, end_idx = purchase_idx[keep], end_idx[keep]
+        
+        prices = price_panel[self.assets].to_numpy(dtype=np.float64)
+        window_sums = _window_price_sums(prices, purchase_idx, end_idx)
+        purchase_col, end_col = dates[purchase_idx].strftime("%Y-%m-%d"), dates[end_idx].strftime("%Y-%m-%d")
+        
+        for block in self._allocation_blocks(portfolio_allocations, chunk_size):
+            portfolio_return, portfolio_volat = _backtest_metrics(block[self.assets].to_numpy(dtype=np.float64), prices, purchase_idx, end_idx, *window_sums)
+            backtest = pd.DataFrame(np.repeat(block[self.assets].to_numpy(), len(purchase_idx), axis=0), columns=self.assets)
+            backtest["PURCHASE_DATE"] = np.tile(purchase_col, len(block))
+            backtest["END_DATE"] = np.tile(end_col, len(block))
+            backtest["RETURN"], backtest["VOLAT"] = portfolio_return.ravel(), portfolio_volat.ravel()
+            yield backtest
+            
+            
+    @profiled(rows=len)
+    def efficient_frontier(self, price_panel: pd.DataFrame, purchase_date: str="2020-01-01", portfolio_metrics: pd.DataFrame=None, resolution: float=0.1, num_points: int=100):
+        """
+        Obtain the efficient frontier (lowest VOLAT for each RETURN) of the portfolios, without enumerating the allocations.
+        Minimizing VOLAT (std/mean of the value) for a target RETURN becomes a convex quadratic program over the weights after the change of variables y = w/mean(w), 
+        which is solved for num_points targets; the optimal weights are rounded to the resolution and evaluated with the same metrics as generate_portfolio_metrics_csv().
+        
+        Args:
+            price_panel (pd.DataFrame):
+                The aligned price panel (dates x assets) obtained with build_price_panel().
             purchase_date (str):
                 The date from which you want to calculate metrics. By default = "2020-01-01" (see exercise statement)
+            portfolio_metrics (pd.DataFrame):
+                Portfolio metrics computed previously (e.g. portfolio_metrics.csv). If given, the frontier is just filtered from them (sort-and-sweep). By default = None.
+            resolution (float):
+                Resolution (percentage) of the weights of the frontier portfolios. By default = 0.1.
+            num_points (int):
+                Number of target returns along the frontier. By default = 100.
+        Returns:
+            pd.DataFrame object with the allocations of the frontier and their RETURN and VOLAT columns, sorted by VOLAT.
+        """
+        
+        if portfolio_metrics is not None:
+            return portfolio_metrics.iloc[pareto_front(portfolio_metrics["VOLAT"].to_numpy(dtype=np.float64), portfolio_metrics["RETURN"].to_numpy(dtype=np.float64))].reset_index(drop=True)
+        
+        # Parameter checking.
+        try:
+            assert resolution > 0 and abs(100/resolution - round(100/resolution)) < 1e-9, f"\033[1m ERROR: \033[0m The resolution ({resolution}) must divide 100."
+        except AssertionError as error:
+            print(error)
+            exit(1)
+        
+        purchase_prices, current_prices, prices = self._metrics_prices(price_panel, purchase_date)
+        # Value of 1 unit of money invested in each asset: its mean, covariance and final return.
+        growth = prices/purchase_prices[:, None]
+        mean_growth = growth.mean(axis=1)
+        covariance = np.atleast_2d(np.cov(growth)) if growth.shape[1] > 1 else np.zeros((len(self.assets), len(self.assets)))
+        covariance = covariance + np.eye(len(self.assets))*1e-12*max(np.trace(covariance), 1e-300)
+        asset_returns = current_prices/purchase_prices - 1
+        
+        # Global minimum volatility portfolio (min y'Cy subject to mean'y = 1, y >= 0), then target returns up to the best asset.
+        start = np.full(len(self.assets), 1/mean_growth.sum())
+        optimal = [_nonnegative_qp(covariance, mean_growth[None, :], np.ones(1), start)]
+        min_return = asset_returns @ (optimal[0]/optimal[0].sum())
+        # With a single asset (or assets with the same return) there are no other target returns, the frontier is the minimum volatility portfolio.
+        targets = np.linspace(min_return, asset_returns.max(), num_points)[1:] if asset_returns.max() - asset_returns.min() > 1e-12 else []
+        for target in targets:
+            # Feasible start mixing the worst and the best asset; the target return is the constraint (returns - target)'y = 0.
+            worst, best = np.argmin(asset_returns), np.argmax(asset_returns)
+            start = np.zeros(len(self.assets))
+            start[best] = (target - asset_returns[worst])/(asset_returns[best] - asset_returns[worst])
+            start[worst] += 1 - start[best]
+            start = start/(mean_growth @ start)
+            optimal.append(_nonnegative_qp(covariance, np.vstack([mean_growth, asset_returns - target]), np.array([1.0, 0.0]), start))
+        
+        optimal = np.array(optimal)
+        units = int(round(100/resolution))
+        weights = _round_to_lattice(optimal/optimal.sum(axis=1, keepdims=True), units)*resolution
+        frontier = pd.DataFrame(np.round(weights, 10), columns=self.assets).drop_duplicates().reset_index(drop=True)
+        frontier["RETURN"], frontier["VOLAT"] = _portfolio_metrics(frontier[self.assets].to_numpy(dtype=np.float64), purchase_prices, current_prices, prices)
+        
+        return frontier.iloc[pareto_front(frontier["VOLAT"].to_numpy(), frontier["RETURN"].to_numpy())].reset_index(drop=True)
+    
+    
+    def _allocation_blocks(self, portfolio_allocations: pd.DataFrame, chunk_size: int):
+        """
+        Split the portfolio allocations in blocks of chunk_size rows.
+        
+        Args:
+            portfolio_allocations (pd.DataFrame):
+                The portfolio allocations generated previously in pd.DataFrame format (None to take them from the enumerator).
+            chunk_size (int):
+                Number of portfolios of each block (None for a single block).
+        Returns:
+            generator of pd.DataFrame objects with the allocations.
+        """
+        
+        # Parameter checking.
+        try:
+            assert chunk_size is None or chunk_size > 0, f"\033[1m ERROR: \033[0m The chunk size ({chunk_size}) must be a positive number of portfolios."
+        except AssertionError as error:
+            print(error)
+            exit(1)
+        if portfolio_allocations is None:
+            return self.iter_portfolio_allocations(chunk_size=chunk_size)
+        chunk_size = max(len(portfolio_allocations), 1) if chunk_size is None else chunk_size
+        return (portfolio_allocations.iloc[start:start + chunk_size][self.assets] for start in range(0, max(len(portfolio_allocations), 1), chunk_size))
+    
+    
+    def _metrics_prices(self, price_panel: pd.DataFrame, purchase_date: str):
+        """
+        Check the purchase date and obtain the prices needed to compute the metrics of the portfolios.
+        
+        Args:
+            price_panel (pd.DataFrame):
+                The aligned price panel (dates x assets) obtained with build_price_panel().
+            purchase_date (str):
+                The date from which you want to calculate metrics.
+        Returns:
+            tuple with the purchase prices, the current prices (one per asset) and the matrix assets x days of prices since the purchase date (included).
         """
 
+        if isinstance(price_panel, dict): price_panel = self.build_price_panel(price_panel)
         # Parameter checking.
-        match = re.search("^(2020)(-)(0[1-9]|1[0-2])(-)(0[1-9]|1[0-9]|2[0-9]|3[0-1])$", purchase_date)
         try:
-            assert match != None, "\033[1m ERROR: \033[0m The date selected is not available or date format is not correct, the format must be the following: YYYY-MM-DD"
-            assert purchase_date not in ["2020-02-30", "2020-02-31", "2020-04-31", "2020-06-31", "2020-09-31", "2020-11-31"], "\033[1m ERROR: \033[0m The introduced date does not exist."
+            purchase_timestamp = _check_date(purchase_date)
+            assert self.start_date <= purchase_timestamp <= self.end_date, f"\033[1m ERROR: \033[0m The date selected ({purchase_date}) is not available, it must be between {self.start_date.date()} and {self.end_date.date()}."
+            # Binary searches on the sorted DatetimeIndex: first date with prices since the purchase date and last one until end_date.
+            purchase_idx = price_panel.index.searchsorted(purchase_timestamp, side="left")
+            current_idx = price_panel.index.searchsorted(self.end_date, side="right") - 1
+            assert len(price_panel) == 0 or purchase_timestamp >= price_panel.index[0] - pd.Timedelta(days=MAX_UNOBSERVED_DAYS), f"\033[1m ERROR: \033[0m There are no prices for the date selected ({purchase_date}), the first prices of all the assets are from {price_panel.index[0].date()}."
+            assert purchase_idx <= current_idx, f"\033[1m ERROR: \033[0m There are no prices for the date selected ({purchase_date})."
         except AssertionError as error:
             print(error)
             exit(1)
         
-        money_invested = 10000 # This value really does not matter.
-        allocations = portfolio_allocations.to_dict("list")
-        asset_money_invested, asset_current_val, asset_values = {}, {}, {}
- 
-        for asset in portfolio_allocations.columns:
+        prices = price_panel[self.assets].to_numpy(dtype=np.float64)
             
-            df_asset = treat_csv_files[asset]
-            # RETURN.
-            # Price initial date.
-            purchase_price = float(df_asset[df_asset["Date"].astype("string") == purchase_date]["Price"])
-            # Price last date.
-            current_price = float(df_asset[df_asset["Date"].astype("string") == "2020-12-31"]["Price"]) 
-            # Number of shares.
-            bj_num_shares = [(((money_invested*alloc)/100)/purchase_price) if alloc != 0 else 0.0 for alloc in allocations[asset]] 
-            # Buy amount and current value for each asset.
-            asset_money_invested[asset] = [num_share*purchase_price for num_share in bj_num_shares]
-            asset_current_val[asset] = [num_share*current_price for num_share in bj_num_shares]
-            # VOLATILITY.
-            # Prices for all days since purchase date (included).
-            prices = list(df_asset[df_asset["Date"].astype('string') >= purchase_date]["Price"])
-            # Calculating sharesji * priceji for all assets for all days for in all portfolios.
-            asset_values[asset] = np.array([np.array([num_shares*price for price in prices]) for num_shares in bj_num_shares]).T 
-
-        # Valuei final calculation, (sum of matrix asset_values[asset]).
-        days_portfolio_prices = 0
-        for i in list(asset_values.values()):
-            days_portfolio_prices += i
-        df_prices_evol = pd.DataFrame(days_portfolio_prices) # Rows=days Cols=portfolios.
-        # RETURN parameters.    
-        buy_amount = pd.DataFrame(asset_money_invested).sum(axis=1)
-        current_value = pd.DataFrame(asset_current_val).sum(axis=1)
-        # VOLATILITY parameters.
-        std_dev = df_prices_evol.std(axis=0)
-        sample_avg = df_prices_evol.mean(axis=0)
-        # Final calculation of RETURN and VOLATILITY.
-        portfolio_allocations["RETURN"] = round(((current_value-buy_amount)/buy_amount)*100, 3)
-        portfolio_allocations["VOLAT"] = round((std_dev/sample_avg)*100, 3)   
-        
-        portfolio_allocations.to_csv(path_or_buf= self.folder_path + "/portfolio_metrics.csv", index=0)           
\ No newline at end of file
+        return prices[purchase_idx], prices[current_idx], prices[purchase_idx:current_idx + 1].T
+
+
+class IncrementalMetrics():
+    """
+    This class allows to keep the metrics of a set of portfolios up to date when the prices of a single asset change, without evaluating every portfolio again.
+    The value of a portfolio is linear in the relative prices (price/purchase price) of its assets, so RETURN, the average value and the variance of every portfolio are kept from per-asset terms: the relative price at the end, the average relative price and the covariance matrix of the relative prices.
+    When one asset changes, only its terms (one column of the covariance matrix) are computed again and each portfolio is updated with the difference, which costs O(portfolios x assets) instead of O(portfolios x assets x days).
+    """
+    def __init__(self, portfolio: Portfolio, price_panel: pd.DataFrame, portfolio_allocations: pd.DataFrame=None, purchase_date: str="2020-01-01"):
+        """
+        Init IncrementalMetrics. Compute the per-asset terms and the state of every portfolio.
+        
+        Args:
+            portfolio (Portfolio):
+                The portfolio object (assets, dates and output folder).
+            price_panel (pd.DataFrame):
+                The aligned price panel (dates x assets) obtained with build_price_panel().
+            portfolio_allocations (pd.DataFrame):
+                The portfolio allocations generated previously in pd.DataFrame format. By default = None (all the allocations of the enumerator).
+            purchase_date (str):
+                The date from which you want to calculate metrics. By default = "2020-01-01" (see exercise statement)
+        """
+        
+        self.portfolio = portfolio
+        self.price_panel = portfolio.build_price_panel(price_panel) if isinstance(price_panel, dict) else price_panel.copy()
+        self.purchase_date = purchase_date
+        self.allocations = next(portfolio.iter_portfolio_allocations()) if portfolio_allocations is None else portfolio_allocations[portfolio.assets].reset_index(drop=True)
+        self.weights = self.allocations.to_numpy(dtype=np.float64)
+        
+        purchase_prices, current_prices, prices = portfolio._metrics_prices(self.price_panel, purchase_date)
+        relative_prices = prices/purchase_prices[:, None]
+        self.num_days = relative_prices.shape[1]
+        # Per-asset terms.
+        self.final_relative = current_prices/purchase_prices
+        self.mean_relative = relative_prices.mean(axis=1)
+        self.centred_relative = relative_prices - self.mean_relative[:, None]
+        self.covariance = self.centred_relative @ self.centred_relative.T
+        # State of each portfolio (percentages): return, average relative value and quadratic form of the covariance.
+        self.portfolio_return = self.weights @ (self.final_relative - 1)
+        self.portfolio_mean = self.weights @ self.mean_relative
+        self.portfolio_quad = np.einsum("pi,pi->p", self.weights @ self.covariance, self.weights)
+        
+        
+    def update_asset_prices(self, asset: str, prices):
+        """
+        Replace the prices of one asset and update the metrics of every portfolio with its difference.
+        
+        Args:
+            asset (str):
+                A string with the acronym of the asset.
+            prices (pd.Series):
+                The new prices indexed by date (or the pd.DataFrame of the treated csv file, with the "Price" column). They must cover the dates of the price panel.
+        """
+        
+        if isinstance(prices, pd.DataFrame): prices = prices["Price"]
+        new_prices = pd.Series(prices, dtype=np.float64).reindex(self.price_panel.index)
+        # Parameter checking.
+        try:
+            assert asset in self.portfolio.assets, f"\033[1m ERROR: \033[0m The asset '{asset}' is not in the portfolio ({' '.join(self.portfolio.assets)})."
+            assert not new_prices.isna().any(), f"\033[1m ERROR: \033[0m The new prices of '{asset}' do not cover all the dates of the price panel."
+        except AssertionError as error:
+            print(error)
+            exit(1)
+        
+        k = self.portfolio.assets.index(asset)
+        self.price_panel[asset] = new_prices
+        purchase_prices, current_prices, prices = self.portfolio._metrics_prices(self.price_panel, self.purchase_date)
+        relative = prices[k]/purchase_prices[k]
+        # Differences of the terms of the asset.
+        delta_final = current_prices[k]/purchase_prices[k] - self.final_relative[k]
+        new_mean = relative.mean()
+        delta_mean = new_mean - self.mean_relative[k]
+        new_centred = relative - new_mean
+        delta_cov = self.centred_relative @ new_centred - self.covariance[:, k]
+        delta_cov[k] = new_centred @ new_centred - self.covariance[k, k]
+        # Portfolio updates: only the weight of the asset and the changed column (and row) of the covariance matrix are used.
+        w_k = self.weights[:, k]
+        self.portfolio_return += w_k*delta_final
+        self.portfolio_mean += w_k*delta_mean
+        self.portfolio_quad += 2*w_k*(self.weights @ delta_cov) - w_k**2*delta_cov[k]
+        # New terms of the asset.
+        self.final_relative[k] += delta_final
+        self.mean_relative[k] = new_mean
+        self.centred_relative[k] = new_centred
+        self.covariance[:, k] += delta_cov
+        self.covariance[k, :] = self.covariance[:, k]
+        
+        
+    def refresh_csv_file(self, asset: str, web_scraping_csv_folder_path: str):
+        """
+        Clean again the web scraping csv file of one asset (e.g. after it is fetched again) and update the metrics with its new prices.
+        
+        Args:
+            asset (str):
+                A string with the acronym of the asset.
+            web_scraping_csv_folder_path (str):
+                A string indicating the path to the folder where the web scraping csv files are.
+        """
+        
+        self.update_asset_prices(asset, self.portfolio._clean_csv_file(web_scraping_csv_folder_path + "/" + self.portfolio.asset_registry.get(asset)["csv_name"]))
+        
+        
+    def portfolio_metrics(self):
+        """
+        Obtain the current metrics of the portfolios (the same values as generate_portfolio_metrics_csv()).
+        
+        Returns:
+            pd.DataFrame object with the allocations and their RETURN and VOLAT columns.
+        """
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            portfolio_volat = np.sqrt(np.maximum(self.portfolio_quad, 0)/(self.num_days - 1))/self.portfolio_mean*100
+        portfolio_metrics = self.allocations.copy()
+        portfolio_metrics["RETURN"] = np.round(self.portfolio_return, 3)
+        portfolio_metrics["VOLAT"] = np.round(portfolio_volat, 3)
+        
+        return portfolio_metrics
+    
+    
+    def generate_portfolio_metrics_csv(self):
+        """
+        Write the current metrics in portfolio_metrics.csv (folder_path of the portfolio).
+        """
+        
+        self.portfolio_metrics().to_csv(path_or_buf= self.portfolio.folder_path + "/portfolio_metrics.csv", index=0)
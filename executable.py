@@ -1,17 +1,295 @@
 #!/usr/bin/env python3
 """
 This file allow the user to execute all .py files more comfortably.
-Please, execute this file with the command: python3 executable.py
+Please, execute this file with the command: python3 executable.py (the instructions are asked in the console)
+or run one or many jobs without questions:
+    python3 executable.py --assets "ST CB PB GO CA" --step 20 --output-folder portfolios_csv_files_folder --graphs-folder graphs_folder
+    python3 executable.py --jobs jobs.json (or jobs.yaml)
+A job file is a list of jobs, or {"defaults": {...}, "jobs": [...]}, where each job has the keys of JOB_DEFAULTS.
+The jobs run in one process: the cleaned csv files and the allocations are reused between jobs, and the outputs that are up to date are not generated again.
+Importing this file does not run anything, and selenium, matplotlib and seaborn are only imported when scraping and graphs are run.
 """
-from data_generation.data_generation import *
-from web_scraping.web_scraping import *
-from data_analysis.data_analysis import *
+import argparse
+import hashlib
+import json
+import os
+import sys
+from data_generation.data_generation import Portfolio
+from profiling.profiling import enable_profiling, enable_profiling_from_env, stage
 
 class color:
     PURPLE, BOLD, END = '\033[95m', '\033[1m', '\033[0m'
-   
-folder_path_csv_webscraping = input("Please, write the" + color.PURPLE + color.BOLD + " route" + color.END + " when you want" + color.PURPLE + color.BOLD + " spawn web scraping csv files: " + color.END)
-dataset_name = input('''Please,''' + color.PURPLE + color.BOLD + ''' write one of the following words (without quotes)\033[0m that represent the csv to spawn:
+
+JOB_DEFAULTS = {
+    "name": None,                                       # Name shown in the messages (by default the position of the job).
+    "csv_folder": "web_scraping_csv_files_folder",      # Folder of the web scraping csv files.
+    "scrape": False,                                    # Obtain the csv files from https://www.investing.com/ before (only the ones that are not fresh).
+    "dataset": "All",                                   # Dataset obtained with scrape.
+    "scrape_workers": 1,                                # Assets fetched at a time with scrape (one browser each).
+    "scrape_incremental": False,                        # Only fetch with scrape the days missing from the csv files, and merge them.
+    "output_folder": "portfolios_csv_files_folder",     # Folder of portfolio_allocations.csv and portfolio_metrics.csv.
+    "assets": "ST CB PB GO CA",                         # Acronyms of the assets separated by spaces.
+    "step": 20,                                         # Increment/decrement (values lower than 1 are fractions, 0.2 = 20).
+    "start_date": "2020-01-01",                         # First date of the prices.
+    "end_date": "2020-12-31",                           # Last date of the prices (selling date).
+    "purchase_date": None,                              # Date from which the metrics are computed (by default start_date).
+    "fill_method": "ffill",                             # How the dates without prices are filled ("ffill", "bday" or "mean").
+    "max_assets_per_portfolio": None,                   # Only the allocations with at most this number of assets with weight (None for all).
+    "sampling": None,                                   # Sampled allocations instead of the grid ("dirichlet" or "halton").
+    "num_samples": 10000,                               # Number of sampled allocations.
+    "seed": 0,                                          # Seed of the sampling.
+    "chunk_size": None,                                 # Portfolios evaluated at a time (the allocations are not kept in memory).
+    "output_format": "csv",                             # Format of the metrics, "csv" (portfolio_metrics.csv) or "npy" (portfolio_metrics.npy, binary and memory-mapped).
+    "metrics": None,                                    # Metrics computed besides RETURN and VOLAT (names of METRIC_REGISTRY, e.g. ["SHARPE", "MAX_DRAWDOWN"]).
+    "workers": 1,                                       # Processes that compute the metrics.
+    "graphs_folder": None,                              # Folder of the graphs (None to not spawn them).
+}
+MANIFEST_FILE = ".job_manifest.json"
+
+
+def normalize_step(increment_decrement: float):
+    """
+    Increment/decrement as an integer percentage (the project statement gives it either as 20 or as 0.2).
+
+    Args:
+        increment_decrement (float):
+            The increment/decrement.
+    Returns:
+        int with the increment/decrement in percentage.
+    """
+
+    increment_decrement = float(increment_decrement)
+    if increment_decrement < 1.0: increment_decrement *= 100
+
+    return int(round(increment_decrement))
+
+
+def load_jobs(path_to_job_file: str):
+    """
+    Read the jobs of a JSON or YAML file (YAML needs the PyYAML package).
+
+    Args:
+        path_to_job_file (str):
+            A string indicating the path to the job file.
+    Returns:
+        list of dict with the jobs (the defaults of the file already applied).
+    """
+
+    # Parameter checking.
+    try:
+        assert os.path.isfile(path_to_job_file), f"\033[1m ERROR: \033[0m The path to the job file ({path_to_job_file}) is not valid."
+    except AssertionError as error:
+        print(error)
+        exit(1)
+
+    with open(path_to_job_file, encoding="utf-8") as f:
+        if path_to_job_file.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                print("\033[1m ERROR: \033[0m PyYAML is needed to read YAML job files (pip install pyyaml), or use a JSON job file.")
+                exit(1)
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    if isinstance(spec, list): spec = {"jobs": spec}
+    defaults = spec.get("defaults", {})
+
+    return [{**defaults, **job} for job in spec.get("jobs", [])]
+
+
+def complete_job(job: dict, position: int):
+    """
+    Check the keys of a job and add the default values of the missing ones.
+
+    Args:
+        job (dict):
+            The job.
+        position (int):
+            Position of the job (its name by default).
+    Returns:
+        dict with all the keys of JOB_DEFAULTS.
+    """
+
+    unknown_keys = [key for key in job if key not in JOB_DEFAULTS]
+    # Parameter checking.
+    try:
+        assert not unknown_keys, f"\033[1m ERROR: \033[0m Unknown job keys: {', '.join(unknown_keys)}. The available ones are: {', '.join(JOB_DEFAULTS)}."
+    except AssertionError as error:
+        print(error)
+        exit(1)
+
+    job = {**JOB_DEFAULTS, **job}
+    job["name"] = job["name"] or f"job {position}"
+    job["step"] = normalize_step(job["step"])
+    job["purchase_date"] = job["purchase_date"] or job["start_date"]
+
+    return job
+
+
+def _fingerprint(values: dict, input_files: list=()):
+    """
+    Fingerprint of the parameters and input files of a stage, to know if its output is up to date.
+
+    Args:
+        values (dict):
+            The parameters of the stage.
+        input_files (list):
+            The paths of the input files (their size and modification time are used). By default = ().
+    Returns:
+        str with the fingerprint.
+    """
+
+    stats = [[path, os.stat(path).st_size, os.stat(path).st_mtime_ns] for path in sorted(input_files) if os.path.exists(path)]
+
+    return hashlib.sha1(json.dumps([values, stats], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class JobRunner():
+    """
+    This class allows to run many jobs in the same process, reusing the cleaned csv files and the allocations and skipping the outputs that are up to date.
+    """
+    def __init__(self, force: bool=False):
+        """
+        Init JobRunner.
+
+        Args:
+            force (bool):
+                A boolean indicating if the outputs are generated even if they are up to date. By default = False.
+        """
+
+        self.force = force
+        # Cleaned csv files of each (csv folder, start date, end date, fill method) and asset (with the fingerprint of the csv file they come from), and allocations of the last (assets, step, maximum number of assets, sampling).
+        self.treated_csv_files = {}
+        self.portfolio_allocations = {}
+
+
+    def _up_to_date(self, output_folder: str, output: str, fingerprint: str, output_path: str=None):
+        """
+        Know if an output of a folder was generated with the same fingerprint.
+
+        Args:
+            output_folder (str):
+                A string indicating the output folder (where the manifest is).
+            output (str):
+                A string with the name of the output (file or folder).
+            fingerprint (str):
+                The fingerprint of the output.
+            output_path (str):
+                A string indicating the path of the output. By default = None (output in output_folder).
+        Returns:
+            bool True if the output exists and is up to date.
+        """
+
+        output_path = os.path.join(output_folder, output) if output_path is None else output_path
+        if self.force or not os.path.exists(output_path) or not os.path.isfile(os.path.join(output_folder, MANIFEST_FILE)): return False
+        with open(os.path.join(output_folder, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f).get(output) == fingerprint
+
+
+    def _save_fingerprint(self, output_folder: str, output: str, fingerprint: str):
+        """
+        Save the fingerprint of an output in the manifest of its folder.
+
+        Args:
+            output_folder (str):
+                A string indicating the output folder.
+            output (str):
+                A string with the name of the output (file or folder).
+            fingerprint (str):
+                The fingerprint of the output.
+        """
+
+        manifest = {}
+        if os.path.isfile(os.path.join(output_folder, MANIFEST_FILE)):
+            with open(os.path.join(output_folder, MANIFEST_FILE), encoding="utf-8") as f:
+                manifest = json.load(f)
+        manifest[output] = fingerprint
+        with open(os.path.join(output_folder, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+
+    def run(self, job: dict):
+        """
+        Run the stages of a job: web scraping (optional), allocations, cleaning, metrics and graphs (optional).
+
+        Args:
+            job (dict):
+                The job, with all the keys of JOB_DEFAULTS (see complete_job()).
+        """
+
+        print(color.PURPLE + color.BOLD + job["name"] + color.END + f": {job['assets']}, step {job['step']}, {job['start_date']} to {job['end_date']}")
+        if job["scrape"]:
+            with stage("web scraping"):
+                # Imported here, so selenium is only needed when scraping.
+                from web_scraping.web_scraping import ObtainCSVFilesFromWeb
+                ObtainCSVFilesFromWeb(web_browser='Chrome', web_page='https://www.investing.com/', workers=job["scrape_workers"]).create_datasets_from_investing(folder_path=job["csv_folder"], dataset_name=job["dataset"], start_date=job["start_date"], end_date=job["end_date"], incremental=job["scrape_incremental"])
+
+        os.makedirs(job["output_folder"], exist_ok=True)
+        portfolio = Portfolio(folder_path=job["output_folder"], assets=job["assets"], increment_decrement=job["step"], start_date=job["start_date"], end_date=job["end_date"], fill_method=job["fill_method"], max_assets_per_portfolio=job["max_assets_per_portfolio"], sampling=job["sampling"], num_samples=job["num_samples"], seed=job["seed"])
+        csv_files = [os.path.join(job["csv_folder"], portfolio.asset_registry.get(asset)["csv_name"]) for asset in portfolio.assets]
+        allocations_key = (tuple(portfolio.assets), job["step"], job["max_assets_per_portfolio"], job["sampling"], job["num_samples"], job["seed"])
+        allocations_fingerprint = _fingerprint({"allocations": allocations_key})
+        metrics_fingerprint = _fingerprint({"allocations": allocations_key, **{key: job[key] for key in ["start_date", "end_date", "purchase_date", "fill_method", "metrics"]}}, csv_files)
+
+        with stage("enumeration"):
+            if self._up_to_date(job["output_folder"], "portfolio_allocations.csv", allocations_fingerprint):
+                print("   portfolio_allocations.csv is up to date.")
+            elif job["chunk_size"] is not None:
+                portfolio.generate_portfolio_allocations_csv(chunk_size=job["chunk_size"])
+                self._save_fingerprint(job["output_folder"], "portfolio_allocations.csv", allocations_fingerprint)
+            else:
+                if allocations_key not in self.portfolio_allocations:
+                    # Only the allocations of the last key are kept: the ones of the previous jobs are released before generating the new ones.
+                    self.portfolio_allocations.clear()
+                    self.portfolio_allocations[allocations_key] = next(portfolio.iter_portfolio_allocations())
+                self.portfolio_allocations[allocations_key].to_csv(path_or_buf=os.path.join(job["output_folder"], "portfolio_allocations.csv"), index=False)
+                self._save_fingerprint(job["output_folder"], "portfolio_allocations.csv", allocations_fingerprint)
+
+        metrics_file = "portfolio_metrics." + job["output_format"]
+        if self._up_to_date(job["output_folder"], metrics_file, metrics_fingerprint):
+            print(f"   {metrics_file} is up to date.")
+        else:
+            with stage("cleaning"):
+                treated_key = (os.path.abspath(job["csv_folder"]), job["start_date"], job["end_date"], job["fill_method"])
+                treated = self.treated_csv_files.setdefault(treated_key, {})
+                # A csv file scraped or edited after it was cleaned has another fingerprint, so it is cleaned again.
+                file_fingerprints = {asset: _fingerprint({}, [csv_file]) for asset, csv_file in zip(portfolio.assets, csv_files)}
+                if any(treated.get(asset, (None, None))[0] != file_fingerprints[asset] for asset in portfolio.assets):
+                    treated.update({asset: (file_fingerprints[asset], csv_treated) for asset, csv_treated in portfolio.treat_csv_files(web_scraping_csv_folder_path=job["csv_folder"], cache_folder_path=os.path.join(job["csv_folder"], ".cache")).items()})
+                price_panel = portfolio.build_price_panel(treat_csv_files={asset: treated[asset][1] for asset in portfolio.assets})
+            with stage("metrics"):
+                # The in-memory allocations are copied, because the metrics are added to them.
+                portfolio_allocations = self.portfolio_allocations.get(allocations_key) if job["chunk_size"] is None else None
+                if job["output_format"] == "npy":
+                    portfolio.generate_portfolio_metrics_npy(price_panel=price_panel, portfolio_allocations=portfolio_allocations, purchase_date=job["purchase_date"], chunk_size=job["chunk_size"] or 100000, workers=job["workers"], metrics=job["metrics"])
+                else:
+                    portfolio.generate_portfolio_metrics_csv(price_panel=price_panel, portfolio_allocations=None if portfolio_allocations is None else portfolio_allocations.copy(), purchase_date=job["purchase_date"], chunk_size=job["chunk_size"], workers=job["workers"], metrics=job["metrics"])
+            self._save_fingerprint(job["output_folder"], metrics_file, metrics_fingerprint)
+
+        if job["graphs_folder"] is not None:
+            graphs_fingerprint = _fingerprint({"graphs_folder": os.path.abspath(job["graphs_folder"]), "period": [job["purchase_date"], job["end_date"]]}, [os.path.join(job["output_folder"], metrics_file)])
+            if self._up_to_date(job["output_folder"], "graphs", graphs_fingerprint, job["graphs_folder"]):
+                print("   The graphs are up to date.")
+            else:
+                with stage("charts"):
+                    # Imported here, so matplotlib and seaborn are only loaded when the graphs are spawned.
+                    from data_analysis.data_analysis import CreateGraphsFromCsv
+                    CreateGraphsFromCsv(path_to_csv_file=os.path.join(job["output_folder"], metrics_file), folder_to_save_graphs=job["graphs_folder"], asset_registry=portfolio.asset_registry, period=(job["purchase_date"], job["end_date"])).render_all()
+                self._save_fingerprint(job["output_folder"], "graphs", graphs_fingerprint)
+
+
+def interactive_job():
+    """
+    Ask the parameters of a job in the console.
+
+    Returns:
+        dict with the job.
+    """
+
+    folder_path_csv_webscraping = input("Please, write the" + color.PURPLE + color.BOLD + " route" + color.END + " when you want" + color.PURPLE + color.BOLD + " spawn web scraping csv files: " + color.END)
+    dataset_name = input('''Please,''' + color.PURPLE + color.BOLD + ''' write one of the following words (without quotes)\033[0m that represent the csv to spawn:
                  - "''' + color.PURPLE + color.BOLD + '''All''' + color.END + '''" --> to create''' + color.PURPLE + color.BOLD + ''' all csv files.''' + color.END + '''
                  - "''' + color.PURPLE + color.BOLD + '''Stocks''' + color.END + '''" --> to''' + color.PURPLE + color.BOLD + ''' create amundi-msci-wrld-ae-c.csv''' + color.END + '''
                  - "''' + color.PURPLE + color.BOLD + '''Corporate bonds''' + color.END + '''" --> to create''' + color.PURPLE + color.BOLD + ''' mishares-global-corporate-bond-$.csv''' + color.END + '''
@@ -19,28 +297,73 @@ dataset_name = input('''Please,''' + color.PURPLE + color.BOLD + ''' write one o
                  - "''' + color.PURPLE + color.BOLD + '''Golds''' + color.END + '''" --> to create''' + color.PURPLE + color.BOLD + ''' spdr-gold-trust.csv''' + color.END + '''
                  - "''' + color.PURPLE + color.BOLD + '''Cash''' + color.END + '''" --> to create''' + color.PURPLE + color.BOLD + ''' usdollar.csv''' + color.END + '''
                  Enter chosen option: ''')
-    
-ObtainCSVFilesFromWeb(web_browser='Chrome', web_page='https://www.investing.com/').create_datasets_from_investing(folder_path=folder_path_csv_webscraping, dataset_name=dataset_name)
-
-path_to_folder_portfolio = input("Please, type the" + color.PURPLE + color.BOLD + " route" + color.END + " when you want spawn" + color.PURPLE + color.BOLD + " portfolio_allocations.csv and portfolio_metrics.csv" + color.END + " files: ")
-    
-increment_decrement = float(input("Please, write the value for the" + color.PURPLE + color.BOLD + " increment/decrement" + color.END + " (the project" + color.PURPLE + color.BOLD + " statement recommends either 20 or 0.2, but it could be another one): " + color.END))
-if increment_decrement < 1.0: increment_decrement *= 100
-increment_decrement = int(increment_decrement)
-assets = input("Please, write the assets acronyms from which you want to create the portfolio without quotes and separated by spaces (" + color.PURPLE + color.BOLD + " ST CB PB GO CA" + color.END + " ): ")
-date = input("Please, write the date from which you want to generate metrics (" + color.PURPLE + color.BOLD + " 2020-01-01 recommended by the statement" + color.END + " but it could be another one). The date must be in the format" + color.PURPLE + color.BOLD + " YYYY-MM-DD" + color.END + ": ")
-    
-portfolio = Portfolio(folder_path=path_to_folder_portfolio, assets=assets, increment_decrement=increment_decrement) 
-portfolio_allocations = portfolio.generate_portfolio_allocations_csv() 
-clean_webscraping_csv_files = portfolio.treat_csv_files(web_scraping_csv_folder_path=folder_path_csv_webscraping) 
-    
-portfolio.generate_portfolio_metrics_csv(treat_csv_files=clean_webscraping_csv_files, portfolio_allocations=portfolio_allocations, purchase_date=date)
-
-consent = input("Do you want to spawn graphs from portfolio_metrics.csv? (" + color.PURPLE + color.BOLD + "Yes/No" + color.END + "): ")
-if consent == "Yes":
-    save_graph_folder = input("Please, write the" + color.PURPLE + color.BOLD + " route" + color.END + " when you want" + color.PURPLE + color.BOLD + " spawn the graphs" + color.END + ": ")
-    graphs = CreateGraphsFromCsv(path_to_csv_file=path_to_folder_portfolio + "/portfolio_metrics.csv", folder_to_save_graphs=save_graph_folder)
-    graphs.bar_plot_type_portfolio()
-    graphs.bar_plot_investing_asset()
-    graphs.bar_plot_sum_assets()
-    graphs.scatter_chart()             
\ No newline at end of file
+    path_to_folder_portfolio = input("Please, type the" + color.PURPLE + color.BOLD + " route" + color.END + " when you want spawn" + color.PURPLE + color.BOLD + " portfolio_allocations.csv and portfolio_metrics.csv" + color.END + " files: ")
+    increment_decrement = input("Please, write the value for the" + color.PURPLE + color.BOLD + " increment/decrement" + color.END + " (the project" + color.PURPLE + color.BOLD + " statement recommends either 20 or 0.2, but it could be another one): " + color.END)
+    assets = input("Please, write the assets acronyms from which you want to create the portfolio without quotes and separated by spaces (" + color.PURPLE + color.BOLD + " ST CB PB GO CA" + color.END + " ): ")
+    date = input("Please, write the date from which you want to generate metrics (" + color.PURPLE + color.BOLD + " 2020-01-01 recommended by the statement" + color.END + " but it could be another one). The date must be in the format" + color.PURPLE + color.BOLD + " YYYY-MM-DD" + color.END + ": ")
+    consent = input("Do you want to spawn graphs from portfolio_metrics.csv? (" + color.PURPLE + color.BOLD + "Yes/No" + color.END + "): ")
+    save_graph_folder = None
+    if consent == "Yes":
+        save_graph_folder = input("Please, write the" + color.PURPLE + color.BOLD + " route" + color.END + " when you want" + color.PURPLE + color.BOLD + " spawn the graphs" + color.END + ": ")
+
+    return {"csv_folder": folder_path_csv_webscraping, "scrape": True, "dataset": dataset_name, "output_folder": path_to_folder_portfolio, "assets": assets, "step": increment_decrement, "purchase_date": date, "graphs_folder": save_graph_folder}
+
+
+def main(argv: list=None):
+    """
+    Entry point: run the jobs of a job file, the job given with the options, or the job asked in the console (without options).
+
+    Args:
+        argv (list):
+            The command line arguments. By default = None (sys.argv).
+    """
+
+    parser = argparse.ArgumentParser(description="Generate portfolios, their metrics and graphs from the web scraping csv files. Without options, the parameters are asked in the console.")
+    parser.add_argument("--jobs", help="JSON or YAML file with the jobs to run")
+    parser.add_argument("--csv-folder", help=f"folder of the web scraping csv files (default {JOB_DEFAULTS['csv_folder']})")
+    parser.add_argument("--scrape", action="store_true", default=None, help="obtain the csv files from investing.com before (only the ones that are not fresh)")
+    parser.add_argument("--dataset", help="dataset obtained with --scrape (default All)")
+    parser.add_argument("--scrape-workers", type=int, help="assets fetched at a time with --scrape, one browser each (default 1)")
+    parser.add_argument("--scrape-incremental", action="store_true", default=None, help="only fetch with --scrape the days missing from the csv files")
+    parser.add_argument("--output-folder", help=f"folder of portfolio_allocations.csv and portfolio_metrics.csv (default {JOB_DEFAULTS['output_folder']})")
+    parser.add_argument("--assets", help="asset acronyms separated by spaces (default \"ST CB PB GO CA\")")
+    parser.add_argument("--step", type=float, help="increment/decrement, 20 or 0.2 (default 20)")
+    parser.add_argument("--start-date", help="first date YYYY-MM-DD (default 2020-01-01)")
+    parser.add_argument("--end-date", help="last date YYYY-MM-DD (default 2020-12-31)")
+    parser.add_argument("--purchase-date", help="date from which the metrics are computed (default the start date)")
+    parser.add_argument("--fill-method", choices=["ffill", "bday", "mean"], help="how the dates without prices are filled (default ffill)")
+    parser.add_argument("--max-assets-per-portfolio", type=int, help="only the allocations with at most this number of assets with weight (default all)")
+    parser.add_argument("--sampling", choices=["dirichlet", "halton"], help="sample the allocations instead of the grid")
+    parser.add_argument("--num-samples", type=int, help="number of sampled allocations (default 10000)")
+    parser.add_argument("--seed", type=int, help="seed of the sampling (default 0)")
+    parser.add_argument("--chunk-size", type=int, help="portfolios evaluated at a time, to bound the memory")
+    parser.add_argument("--output-format", choices=["csv", "npy"], help="format of the metrics, npy is binary and memory-mapped (default csv)")
+    parser.add_argument("--metrics", nargs="+", help="metrics computed besides RETURN and VOLAT (SHARPE, SORTINO, MAX_DRAWDOWN, VAR_95, CVAR_95, LOG_VOLAT)")
+    parser.add_argument("--workers", type=int, help="processes that compute the metrics (default 1)")
+    parser.add_argument("--graphs-folder", help="folder of the graphs (they are not spawned without it)")
+    parser.add_argument("--force", action="store_true", help="generate the outputs even if they are up to date")
+    parser.add_argument("--profile", metavar="REPORT", help="write a JSON report with the time and memory of each stage")
+    parser.add_argument("--profile-deep", action="store_true", help="also capture cProfile and tracemalloc (slower)")
+    args = parser.parse_args(argv)
+
+    if args.profile or args.profile_deep:
+        enable_profiling(report_path=args.profile, deep=args.profile_deep)
+    else:
+        enable_profiling_from_env()
+
+    # The options given in the command line replace the ones of the job file.
+    options = {key: value for key, value in vars(args).items() if key in JOB_DEFAULTS and value is not None}
+    if args.jobs is not None:
+        jobs = [{**job, **options} for job in load_jobs(args.jobs)]
+    elif len(argv if argv is not None else sys.argv[1:]) == 0:
+        jobs = [interactive_job()]
+    else:
+        jobs = [options]
+
+    runner = JobRunner(force=args.force)
+    for position, job in enumerate(jobs, start=1):
+        runner.run(complete_job(job, position))
+
+
+if __name__ == "__main__":
+    main()
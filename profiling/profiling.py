@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+This file contains the optional instrumentation of the stages of the project (web scraping, cleaning, generation, metrics and graphs).
+Each stage records its wall time, CPU time, rows processed and memory change, and a JSON report (and a log line per stage) is written at the end of the run.
+Deep profiling (cProfile of the whole run and tracemalloc peak of each stage) is turned on with a single option.
+While it is disabled (default), a decorated method only checks a flag and a stage is a shared object that does nothing.
+"""
+import atexit
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+_enabled = False
+_options = {"report_path": None, "deep": False, "log": True}
+_records = []
+# Stages being measured by each thread (innermost last).
+_thread_stages = threading.local()
+_profiler = None
+_start_time = None
+
+
+def _active_stages():
+    """
+    Stages being measured by the current thread, so that the stages of concurrent threads are not nested in each other.
+
+    Returns:
+        list of Stage objects (innermost last).
+    """
+
+    if not hasattr(_thread_stages, "stack"): _thread_stages.stack = []
+    return _thread_stages.stack
+
+
+def _current_rss_mb():
+    """
+    Resident memory of the current process (the peak one where the current one is not available).
+
+    Returns:
+        float with the memory in MB.
+    """
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")/1024**2
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak/(1024**2 if sys.platform == "darwin" else 1024)
+
+
+class Stage():
+    """
+    This class allows to measure a stage of the run (use it with stage()).
+    """
+    def __init__(self, name: str, rows: int=None):
+        """
+        Init Stage.
+
+        Args:
+            name (str):
+                A string with the name of the stage (e.g. "Portfolio.treat_csv_files").
+            rows (int):
+                Number of rows processed by the stage, if it is known beforehand. More rows can be added with add_rows(). By default = None.
+        """
+
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        stack = _active_stages()
+        self.parent = stack[-1].name if stack else None
+        self.depth = len(stack)
+        stack.append(self)
+        if _options["deep"]:
+            self.traced_before = tracemalloc.get_traced_memory()[0]
+            self.traced_peak = 0
+            tracemalloc.reset_peak()
+        self.rss_before = _current_rss_mb()
+        self.cpu_before = time.process_time()
+        self.wall_before = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.wall_before
+        cpu = time.process_time() - self.cpu_before
+        record = {
+            "stage": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rows": self.rows,
+            "rows_per_s": round(self.rows/wall, 1) if self.rows and wall > 0 else None,
+            "rss_delta_mb": round(_current_rss_mb() - self.rss_before, 3),
+            "error": None if exc_type is None else exc_type.__name__,
+        }
+        _active_stages().remove(self)
+        if _options["deep"]:
+            # Peak of the Python allocations of this stage. The inner stages reset the peak, so each one passes its peak to its parent.
+            self.traced_peak = max(self.traced_peak, tracemalloc.get_traced_memory()[1])
+            record["traced_peak_mb"] = round((self.traced_peak - self.traced_before)/1024**2, 3)
+            if _active_stages(): _active_stages()[-1].traced_peak = max(_active_stages()[-1].traced_peak, self.traced_peak)
+        _records.append(record)
+        if _options["log"]:
+            print(f"[profiling] {'  '*self.depth}{self.name}: wall {wall:.3f}s, cpu {cpu:.3f}s" + (f", {self.rows} rows ({record['rows_per_s']}/s)" if self.rows else "") + f", memory {record['rss_delta_mb']:+.1f} MB" + (f", traced peak {record['traced_peak_mb']:.1f} MB" if _options["deep"] else ""), file=sys.stderr)
+        return False
+
+
+class _DisabledStage():
+    """
+    Stage used while the instrumentation is disabled, it does nothing.
+    """
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_DISABLED_STAGE = _DisabledStage()
+
+
+def stage(name: str, rows: int=None):
+    """
+    Context manager that measures a stage (e.g. with stage("metrics"): ...).
+
+    Args:
+        name (str):
+            A string with the name of the stage.
+        rows (int):
+            Number of rows processed by the stage, if it is known beforehand. By default = None.
+    Returns:
+        Stage object (a shared object that does nothing while the instrumentation is disabled).
+    """
+
+    return Stage(name, rows) if _enabled else _DISABLED_STAGE
+
+
+def profiled(name: str=None, rows=None):
+    """
+    Decorator that measures each call of a function or method as a stage.
+
+    Args:
+        name (str):
+            A string with the name of the stage. By default = None (qualified name of the function, e.g. "Portfolio.treat_csv_files").
+        rows (function):
+            Function that obtains the rows processed from the returned value (e.g. len). By default = None (rows given with add_rows()).
+    Returns:
+        The decorator.
+    """
+
+    def decorator(function):
+        stage_name = function.__qualname__ if name is None else name
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled: return function(*args, **kwargs)
+            with Stage(stage_name) as current:
+                result = function(*args, **kwargs)
+                if rows is not None and result is not None: current.rows = (current.rows or 0) + rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def add_rows(rows: int):
+    """
+    Add rows processed to the innermost active stage (nothing while the instrumentation is disabled).
+
+    Args:
+        rows (int):
+            Number of rows processed.
+    """
+
+    if _enabled and _active_stages():
+        _active_stages()[-1].rows = (_active_stages()[-1].rows or 0) + rows
+
+
+def enable_profiling(report_path: str=None, deep: bool=False, log: bool=True):
+    """
+    Turn on the instrumentation. The report is written by disable_profiling() or at the end of the program.
+
+    Args:
+        report_path (str):
+            A string indicating the path of the JSON report. By default = None (only the log lines).
+        deep (bool):
+            A boolean indicating if cProfile (whole run, saved next to the report as .prof) and tracemalloc (peak of each stage) are also captured. They slow down the run. By default = False.
+        log (bool):
+            A boolean indicating if a log line is printed (standard error) at the end of each stage. By default = True.
+    """
+
+    global _enabled, _profiler, _start_time
+    if _enabled: return
+    _options.update({"report_path": report_path, "deep": deep, "log": log})
+    _records.clear()
+    _start_time = time.perf_counter()
+    if deep:
+        tracemalloc.start()
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    _enabled = True
+    atexit.register(disable_profiling)
+
+
+def enable_profiling_from_env():
+    """
+    Turn on the instrumentation if the environment variable PORTFOLIO_PROFILE is set (its value is the path of the JSON report, "1" for only the log lines).
+    PORTFOLIO_PROFILE_DEEP=1 also captures cProfile and tracemalloc.
+    """
+
+    report_path = os.environ.get("PORTFOLIO_PROFILE")
+    if report_path:
+        enable_profiling(report_path=None if report_path == "1" else report_path, deep=os.environ.get("PORTFOLIO_PROFILE_DEEP") == "1")
+
+
+def disable_profiling():
+    """
+    Turn off the instrumentation and write the report.
+
+    Returns:
+        dict with the report (None if the instrumentation was not enabled).
+    """
+
+    global _enabled, _profiler
+    if not _enabled: return None
+    _enabled = False
+    atexit.unregister(disable_profiling)
+    report = {"total_wall_s": round(time.perf_counter() - _start_time, 6), "stages": list(_records)}
+    if _profiler is not None:
+        _profiler.disable()
+        tracemalloc.stop()
+        stats_text = io.StringIO()
+        stats = pstats.Stats(_profiler, stream=stats_text)
+        stats.sort_stats("cumulative").print_stats(30)
+        report["cprofile_top"] = stats_text.getvalue().splitlines()
+        if _options["report_path"]:
+            os.makedirs(os.path.dirname(os.path.abspath(_options["report_path"])), exist_ok=True)
+            report["cprofile_file"] = os.path.splitext(_options["report_path"])[0] + ".prof"
+            stats.dump_stats(report["cprofile_file"])
+        _profiler = None
+    if _options["report_path"]:
+        os.makedirs(os.path.dirname(os.path.abspath(_options["report_path"])), exist_ok=True)
+        with open(_options["report_path"], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return report
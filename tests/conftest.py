@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+"""
+Configuration of the tests: the modules of the project are imported from the root folder (as in executable.py).
+
+Please, execute the tests with the command: python3 -m pytest tests
+"""
+import os
+import sys
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_FOLDER)
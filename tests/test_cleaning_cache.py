@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Tests of the cache of the treated csv files (Portfolio.treat_csv_files() with cache_folder_path).
+"""
+import os
+import shutil
+from data_generation.data_generation import Portfolio
+
+CSV_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web_scraping_csv_files_folder")
+
+
+def test_cache_round_trip(tmp_path):
+    portfolio = Portfolio(str(tmp_path), "ST CB PB GO CA", 20)
+    treated = portfolio.treat_csv_files(CSV_FOLDER)
+
+    # The first call stores the entries and the second one loads them (memory-mapped).
+    for _ in range(2):
+        cached = portfolio.treat_csv_files(CSV_FOLDER, str(tmp_path / "cache"))
+        for asset in portfolio.assets:
+            assert cached[asset].equals(treated[asset])
+            assert cached[asset].index.name == "Date"
+    # The columns are read-only views of the memory-mapped entry.
+    assert not cached["ST"]["Price"].to_numpy().flags.writeable
+
+
+def test_cache_keeps_other_dates_and_drops_old_content(tmp_path):
+    csv_folder = str(tmp_path / "csv")
+    shutil.copytree(CSV_FOLDER, csv_folder)
+    cache_folder = str(tmp_path / "cache")
+    whole_year = Portfolio(str(tmp_path), "GO", 20)
+    from_march = Portfolio(str(tmp_path), "GO", 20, start_date="2020-03-01")
+
+    whole_year.treat_csv_files(csv_folder, cache_folder)
+    from_march.treat_csv_files(csv_folder, cache_folder)
+    assert len(os.listdir(cache_folder)) == 2
+    # A new content of the csv file invalidates the entries of every date range.
+    with open(csv_folder + "/spdr-gold-trust.csv", encoding="utf-8") as f:
+        content = f.read()
+    with open(csv_folder + "/spdr-gold-trust.csv", "w", encoding="utf-8") as f:
+        f.write(content.replace("178.36", "178.37", 1))
+    treated = whole_year.treat_csv_files(csv_folder, cache_folder)
+    assert len(os.listdir(cache_folder)) == 1
+    assert treated["GO"]["Price"].iloc[-1] == 178.37
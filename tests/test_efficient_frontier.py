@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests of Portfolio.efficient_frontier(), checked against the brute-force frontier (pareto_front() of every portfolio of a small grid).
+"""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from data_generation.data_generation import Portfolio, pareto_front
+
+CSV_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web_scraping_csv_files_folder")
+
+
+def frontier_and_grid(tmp_path, assets: str):
+    """
+    Compute the efficient frontier and the metrics of every portfolio of a grid with step 10.
+
+    Args:
+        tmp_path (pathlib.Path):
+            Folder of the outputs.
+        assets (str):
+            Acronyms of the assets separated by spaces.
+    Returns:
+        tuple with the frontier and the grid (pd.DataFrame).
+    """
+
+    portfolio = Portfolio(str(tmp_path), assets, 10)
+    price_panel = portfolio.build_price_panel(portfolio.treat_csv_files(CSV_FOLDER))
+    frontier = portfolio.efficient_frontier(price_panel)
+    grid = pd.concat(portfolio.iter_portfolio_metrics(price_panel), ignore_index=True)
+
+    return frontier, grid
+
+
+@pytest.mark.parametrize("assets", ["GO", "ST"])
+def test_single_asset_frontier_is_the_asset(tmp_path, assets):
+    frontier, grid = frontier_and_grid(tmp_path, assets)
+
+    assert len(frontier) == 1
+    assert frontier[assets].tolist() == [100]
+    assert frontier[["RETURN", "VOLAT"]].to_numpy().tolist() == grid[["RETURN", "VOLAT"]].to_numpy().tolist()
+
+
+@pytest.mark.parametrize("assets", ["ST CB PB GO CA", "CB PB GO"])
+def test_frontier_is_not_dominated_by_the_grid(tmp_path, assets):
+    frontier, grid = frontier_and_grid(tmp_path, assets)
+    grid_front = grid.iloc[pareto_front(grid["VOLAT"].to_numpy(), grid["RETURN"].to_numpy())]
+
+    assert np.isfinite(frontier[["RETURN", "VOLAT"]].to_numpy()).all()
+    assert np.allclose(frontier[frontier.columns[:-2]].sum(axis=1), 100)
+    # No portfolio of the brute-force frontier has lower volatility and higher return than a portfolio of the frontier.
+    for _, point in frontier.iterrows():
+        assert not ((grid_front["VOLAT"] < point["VOLAT"]) & (grid_front["RETURN"] > point["RETURN"])).any()
+    # The frontier reaches the least risky and the best portfolios of the grid.
+    assert frontier["VOLAT"].min() <= grid_front["VOLAT"].min()
+    assert frontier["RETURN"].max() >= grid_front["RETURN"].max()
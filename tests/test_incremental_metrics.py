@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests of IncrementalMetrics, checked against the metrics computed again from the whole price panel.
+"""
+import os
+import numpy as np
+import pandas as pd
+from data_generation.data_generation import IncrementalMetrics, Portfolio
+
+CSV_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web_scraping_csv_files_folder")
+
+
+def full_recompute(portfolio, price_panel, purchase_date):
+    """
+    Compute the metrics of every allocation of the grid from the whole price panel (in-memory path of generate_portfolio_metrics_csv()).
+
+    Args:
+        portfolio (Portfolio):
+            The portfolio object.
+        price_panel (pd.DataFrame):
+            The price panel.
+        purchase_date (str):
+            The purchase date.
+    Returns:
+        pd.DataFrame object with the allocations and their RETURN and VOLAT columns.
+    """
+
+    portfolio.generate_portfolio_metrics_csv(price_panel, next(portfolio.iter_portfolio_allocations()), purchase_date)
+
+    return pd.read_csv(portfolio.folder_path + "/portfolio_metrics.csv")
+
+
+def test_updates_are_the_full_recompute(tmp_path):
+    portfolio = Portfolio(str(tmp_path), "ST CB PB GO CA", 10)
+    price_panel = portfolio.build_price_panel(portfolio.treat_csv_files(CSV_FOLDER))
+    incremental = IncrementalMetrics(portfolio, price_panel, purchase_date="2020-03-02")
+    rng = np.random.default_rng(0)
+
+    # Several updates, of different assets and of the same asset twice.
+    for asset in ["GO", "ST", "GO"]:
+        price_panel = price_panel.copy()
+        price_panel[asset] = price_panel[asset]*rng.uniform(0.9, 1.1, len(price_panel))
+        incremental.update_asset_prices(asset, price_panel[asset])
+        expected = full_recompute(portfolio, price_panel, "2020-03-02")
+        metrics = incremental.portfolio_metrics()
+
+        assert metrics[portfolio.assets].equals(expected[portfolio.assets])
+        # The updates only differ in the rounding of the last decimal.
+        assert np.allclose(metrics[["RETURN", "VOLAT"]].to_numpy(), expected[["RETURN", "VOLAT"]].to_numpy(), rtol=0, atol=1e-3 + 1e-9)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests of the ways of computing portfolio_metrics.csv (chunked, with a process pool, through portfolio_metrics.npy or as a one-date backtest), checked against the in-memory computation.
+"""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from data_generation.data_generation import Portfolio, export_portfolio_metrics_csv
+
+CSV_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web_scraping_csv_files_folder")
+ASSETS = "ST CB PB GO CA"
+PURCHASE_DATE = "2020-03-02"
+
+
+def in_memory_metrics(tmp_path):
+    """
+    Compute portfolio_metrics.csv of a grid with step 10 with the in-memory path (all the allocations at once, one process).
+
+    Args:
+        tmp_path (pathlib.Path):
+            Folder of the outputs.
+    Returns:
+        tuple with the portfolio, the price panel and the content (bytes) of portfolio_metrics.csv.
+    """
+
+    portfolio = Portfolio(str(tmp_path / "in_memory"), ASSETS, 10)
+    price_panel = portfolio.build_price_panel(portfolio.treat_csv_files(CSV_FOLDER))
+    portfolio.generate_portfolio_metrics_csv(price_panel, next(portfolio.iter_portfolio_allocations()), PURCHASE_DATE)
+    with open(portfolio.folder_path + "/portfolio_metrics.csv", "rb") as f:
+        content = f.read()
+
+    return portfolio, price_panel, content
+
+
+@pytest.mark.parametrize("chunk_size, workers", [(97, 1), (None, 2), (97, 2)])
+def test_chunked_and_workers_csv_is_the_in_memory_csv(tmp_path, chunk_size, workers):
+    _, price_panel, expected = in_memory_metrics(tmp_path)
+    portfolio = Portfolio(str(tmp_path / "other"), ASSETS, 10)
+    portfolio_allocations = next(portfolio.iter_portfolio_allocations()) if chunk_size is None else None
+
+    portfolio.generate_portfolio_metrics_csv(price_panel, portfolio_allocations, PURCHASE_DATE, chunk_size=chunk_size, workers=workers)
+    with open(portfolio.folder_path + "/portfolio_metrics.csv", "rb") as f:
+        assert f.read() == expected
+
+
+def test_exported_npy_is_the_in_memory_csv(tmp_path):
+    _, price_panel, expected = in_memory_metrics(tmp_path)
+    portfolio = Portfolio(str(tmp_path / "npy"), ASSETS, 10)
+
+    portfolio.generate_portfolio_metrics_npy(price_panel, purchase_date=PURCHASE_DATE, chunk_size=97)
+    with open(export_portfolio_metrics_csv(portfolio.folder_path + "/portfolio_metrics.npy", chunk_size=300), "rb") as f:
+        assert f.read() == expected
+
+
+def test_one_date_backtest_is_the_metrics_csv(tmp_path):
+    portfolio, price_panel, _ = in_memory_metrics(tmp_path)
+    metrics = pd.read_csv(portfolio.folder_path + "/portfolio_metrics.csv")
+
+    backtest = pd.concat(portfolio.iter_portfolio_backtest(price_panel, [PURCHASE_DATE], chunk_size=97), ignore_index=True)
+    assert backtest[portfolio.assets].equals(metrics[portfolio.assets])
+    assert (backtest["PURCHASE_DATE"] == PURCHASE_DATE).all() and (backtest["END_DATE"] == "2020-12-31").all()
+    assert np.array_equal(backtest[["RETURN", "VOLAT"]].to_numpy(), metrics[["RETURN", "VOLAT"]].to_numpy(), equal_nan=True)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests of the web scraping part, offline: the historical data tables are read from the saved html files of tests/fixtures (HtmlFilePageSource).
+"""
+import os
+from queue import Queue
+import pandas as pd
+import pytest
+from web_scraping.web_scraping import HtmlFilePageSource, ObtainCSVFilesFromWeb, SeleniumPageSource
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def scraper():
+    """
+    Web scraping object that reads the fixtures instead of the web page.
+
+    Returns:
+        ObtainCSVFilesFromWeb object.
+    """
+
+    return ObtainCSVFilesFromWeb(web_browser="Chrome", web_page="https://www.investing.com/", page_source=HtmlFilePageSource(FIXTURES_FOLDER))
+
+
+def stored_dates(csv_file: str):
+    """
+    Dates stored in a csv file created by the web scraping part, sorted.
+
+    Args:
+        csv_file (str):
+            A string indicating the path to the csv file.
+    Returns:
+        list of pd.Timestamp objects.
+    """
+
+    return sorted(pd.to_datetime(pd.read_csv(csv_file).iloc[:, 0], format="%b %d, %Y"))
+
+
+def test_fetch_keeps_the_dates_requested(tmp_path):
+    created = scraper().create_datasets_from_investing(str(tmp_path), "Golds", start_date="2020-02-01", end_date="2020-02-29")
+    df = pd.read_csv(created[0], index_col=0)
+
+    assert created == [str(tmp_path) + "/spdr-gold-trust.csv"]
+    assert stored_dates(created[0])[0] == pd.Timestamp("2020-02-03") and stored_dates(created[0])[-1] == pd.Timestamp("2020-02-28")
+    assert list(df.columns) == ["Price", "Vol.", "Change %"]
+    assert df.loc["Feb 28, 2020", "Price"] == 148.38
+
+
+def test_fresh_csv_file_is_fetched_again_for_a_wider_range(tmp_path):
+    scraper().create_datasets_from_investing(str(tmp_path), "Golds", start_date="2020-02-01", end_date="2020-02-29")
+
+    # Modified just now, but it does not cover January.
+    created = scraper().create_datasets_from_investing(str(tmp_path), "Golds", start_date="2020-01-01", end_date="2020-02-29")
+    assert len(created) == 1 and stored_dates(created[0])[0] == pd.Timestamp("2020-01-02")
+    # Now it covers the dates (1 January is a holiday), so it is not fetched again.
+    assert scraper().create_datasets_from_investing(str(tmp_path), "Golds", start_date="2020-01-01", end_date="2020-02-29") == []
+
+
+def test_incremental_fetches_the_missing_head_and_tail(tmp_path):
+    scraper().create_datasets_from_investing(str(tmp_path), "Golds", start_date="2020-01-20", end_date="2020-02-10")
+
+    # Only January 1-19 and February 11-29 are fetched, and merged with the stored rows.
+    created = scraper().create_datasets_from_investing(str(tmp_path), "Golds", start_date="2020-01-01", end_date="2020-02-29", incremental=True)
+    merged = pd.read_csv(created[0], index_col=0)
+    scraper().create_datasets_from_investing(str(tmp_path / "full"), "Golds", start_date="2020-01-01", end_date="2020-02-29")
+    assert merged.equals(pd.read_csv(str(tmp_path / "full") + "/spdr-gold-trust.csv", index_col=0))
+    # The stored rows cover the dates now.
+    assert scraper().create_datasets_from_investing(str(tmp_path), "Golds", start_date="2020-01-01", end_date="2020-02-29", incremental=True) == []
+
+
+def test_closed_page_source_is_not_used_again(tmp_path):
+    web_scraping = scraper()
+    web_scraping.create_datasets_from_investing(str(tmp_path), "Golds", start_date="2020-02-01", end_date="2020-02-29", max_age_hours=0)
+
+    with pytest.raises(SystemExit):
+        web_scraping.create_datasets_from_investing(str(tmp_path), "Golds", start_date="2020-02-01", end_date="2020-02-29", max_age_hours=0)
+    with pytest.raises(RuntimeError):
+        web_scraping.page_source.fetch_table_html("US78463V1070", "", "2020-02-01", "2020-02-29")
+
+
+@pytest.mark.parametrize("web_browser, pool_size", [("Firefox", 1), ("Chrome", 0)])
+def test_selenium_page_source_rejects_an_empty_pool(web_browser, pool_size):
+    # Checked before selenium is imported, so no web browser is needed.
+    with pytest.raises(SystemExit):
+        SeleniumPageSource(web_browser, "https://www.investing.com/", pool_size=pool_size)
+
+
+def test_selenium_page_source_without_free_drivers_fails():
+    page_source = SeleniumPageSource.__new__(SeleniumPageSource)
+    page_source.drivers, page_source.pool_timeout, page_source.closed = Queue(), 0.1, False
+
+    with pytest.raises(RuntimeError):
+        page_source.fetch_table_html("US78463V1070", "", "2020-02-01", "2020-02-29")
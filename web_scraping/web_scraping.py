@@ -5,20 +5,217 @@ The code below, through webscraping on the web page https://www.investing.com/ o
 
 """
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from queue import Empty, Queue
 import pandas as pd
+import numpy as np
 import os
+import time
+from asset_registry.asset_registry import AssetRegistry, DEFAULT_ASSET_REGISTRY
+from profiling.profiling import profiled, add_rows
+
+# Longest run of days without prices (weekends and holidays) between an edge of the dates requested and the prices stored for it to still be covered.
+MAX_UNOBSERVED_DAYS = 5
+
+
+class SeleniumPageSource():
+    """
+    This class obtains the html of the historical data table of an asset from the web page, using a pool of Chrome drivers.
+    """
+    def __init__(self, web_browser: str, web_page: str, headless: bool=True, pool_size: int=1, timeout: float=10, pool_timeout: float=300):
+        """
+        Init SeleniumPageSource. Initialize the web browser options and the pool of drivers.
+        
+        Args:
+            web_browser (str): 
+                A string represents the web browser.
+            web_page (str):
+                A string represents the URL to the web page.
+            headless (bool):
+                A boolean indicating if the web browser runs without window. By default = True.
+            pool_size (int):
+                Number of drivers (web browsers) that can be used at the same time. By default = 1.
+            timeout (float):
+                Seconds to wait for each element of the web page. By default = 10.
+            pool_timeout (float):
+                Seconds to wait for a free driver of the pool. By default = 300.
+        """
+        
+        # Parameter checking.
+        try:
+            assert web_browser == "Chrome", f"\033[1m ERROR: \033[0m Web browser '{web_browser}' not available, it must be 'Chrome'."
+            assert pool_size >= 1, f"\033[1m ERROR: \033[0m The number of web browsers ({pool_size}) must be at least 1."
+        except AssertionError as error:
+            print(error)
+            exit(1)
+        
+        # Selenium is only imported when the web page is really used.
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        
+        self.web_page = web_page
+        self.timeout = timeout
+        self.pool_timeout = pool_timeout
+        self.closed = False
+        self.drivers = Queue()
+        chrome_options = Options()
+        if headless: chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--start-maximized")
+        chrome_options.add_argument("--log-level=1")
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--window-size=1920x1080")
+        for _ in range(pool_size):
+            driver = webdriver.Chrome(options=chrome_options)
+            driver.get(self.web_page)
+            self._close_popup(driver)
+            self.drivers.put(driver)
+    
+    
+    def _close_popup(self, driver):
+        """
+        Close the cookies popup of the web page (if it appears).
+        
+        Args:
+            driver (webdriver):
+                The driver in which the popup is closed.
+        """
+        
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        
+        try:
+            WebDriverWait(driver, self.timeout).until(EC.element_to_be_clickable((By.XPATH, '//*[@id="onetrust-accept-btn-handler"]'))).click()
+        except TimeoutException:
+            pass
+    
+    
+    def fetch_table_html(self, asset_code: str, stockmarket: str, start_date: str, end_date: str):
+        """
+        Obtain the html of the historical data table of an asset, using the first free driver of the pool.
+        
+        Args:
+            asset_code (str):
+                A string representing the code of the asset in the searcher.
+            stockmarket (str):
+                A string representing the stock market of the asset in the search results.
+            start_date (str):
+                First date (YYYY-MM-DD) of the historical data.
+            end_date (str):
+                Last date (YYYY-MM-DD) of the historical data.
+        Returns:
+            str with the html of the table.
+        """
+        
+        if self.closed: raise RuntimeError("The web browsers were closed, create another page source.")
+        try:
+            driver = self.drivers.get(timeout=self.pool_timeout)
+        except Empty:
+            raise RuntimeError(f"No web browser of the pool was free after {self.pool_timeout} seconds.")
+        try:
+            from selenium.webdriver.common.by import By
+            from selenium.webdriver.support.ui import WebDriverWait
+            from selenium.webdriver.support import expected_conditions as EC
+            
+            driver.get(self.web_page)
+            # Write the asset code in the searcher line.
+            driver.find_element(by=By.TAG_NAME, value="INPUT").send_keys(asset_code)
+            # Search button.
+            driver.find_element(by=By.TAG_NAME, value="LABEL").click()
+            # Select desired asset.
+            WebDriverWait(driver, self.timeout).until(EC.element_to_be_clickable((By.PARTIAL_LINK_TEXT, stockmarket))).click()
+            # Historical data button.
+            driver.find_element(by=By.LINK_TEXT, value="Historical Data").click()
+            # Opening calendar.
+            WebDriverWait(driver, self.timeout).until(EC.element_to_be_clickable((By.ID, "widgetFieldDateRange"))).click()
+            # Modify startDate value.
+            start_date_search_bar = driver.find_element(by=By.ID, value="startDate")
+            start_date_search_bar.clear()
+            start_date_search_bar.send_keys(pd.Timestamp(start_date).strftime("%m/%d/%Y"))
+            # Modify endDate value.
+            end_date_search_bar = driver.find_element(by=By.ID, value="endDate")
+            end_date_search_bar.clear()
+            end_date_search_bar.send_keys(pd.Timestamp(end_date).strftime("%m/%d/%Y"))
+            # Applying date changes to the calendar.
+            driver.find_element(by=By.ID, value="applyBtn").click()
+            # Wait until the table is available.
+            html_table = WebDriverWait(driver, self.timeout).until(EC.element_to_be_clickable((By.ID, "curr_table")))
+            
+            return html_table.get_attribute("outerHTML")
+        
+        finally:
+            self.drivers.put(driver)
+    
+    
+    def close(self):
+        """
+        Close all the drivers of the pool. The page source can not be used afterwards.
+        """
+        
+        self.closed = True
+        while not self.drivers.empty():
+            self.drivers.get().quit()
+
+
+class HtmlFilePageSource():
+    """
+    This class obtains the html of the historical data table of an asset from saved html files (e.g. fixtures to work offline).
+    """
+    def __init__(self, folder_path: str):
+        """
+        Init HtmlFilePageSource.
+        
+        Args:
+            folder_path (str):
+                A string indicating the folder with one html file per asset, named "<asset_code>.html".
+        """
+        
+        self.folder_path = folder_path
+        self.closed = False
+    
+    
+    def fetch_table_html(self, asset_code: str, stockmarket: str, start_date: str, end_date: str):
+        """
+        Read the saved html of the historical data table of an asset, keeping only the rows between start_date and end_date (as the web page does).
+        
+        Args:
+            asset_code (str):
+                A string representing the code of the asset.
+            stockmarket (str):
+                A string representing the stock market of the asset.
+            start_date (str):
+                First date (YYYY-MM-DD) of the historical data.
+            end_date (str):
+                Last date (YYYY-MM-DD) of the historical data.
+        Returns:
+            str with the html of the table.
+        """
+        
+        if self.closed: raise RuntimeError("The page source was closed, create another one.")
+        with open(self.folder_path + "/" + asset_code + ".html", encoding="utf-8") as f:
+            df = pd.read_html(StringIO(f.read()))[0]
+        dates = pd.to_datetime(df["Date"], format="%b %d, %Y")
+        
+        return df[(dates >= pd.Timestamp(start_date)) & (dates <= pd.Timestamp(end_date))].to_html(index=False, table_id="curr_table")
+    
+    
+    def close(self):
+        """
+        Close the page source (as SeleniumPageSource.close(), it can not be used afterwards).
+        """
+        
+        self.closed = True
 
 
 class ObtainCSVFilesFromWeb():
     """
     This class allows to create different datasets using web scraping.
     """
-    def __init__(self, web_browser: str, web_page: str):
+    def __init__(self, web_browser: str, web_page: str, page_source=None, headless: bool=True, workers: int=1, asset_registry: AssetRegistry=None):
         """
         Init ObtainCSVFilesFromWeb. Initialize the web browser options and the web page from which the information is to be extracted.
         
@@ -27,23 +224,28 @@ class ObtainCSVFilesFromWeb():
                 A string represents the web browser.
             web_page (str):
                 A string represents the URL to the web page.
+            page_source (object):
+                An object with the methods fetch_table_html() and close() (e.g. HtmlFilePageSource). By default = None (SeleniumPageSource with the web browser and web page).
+            headless (bool):
+                A boolean indicating if the web browser runs without window. By default = True.
+            workers (int):
+                Number of assets that are fetched at the same time (one web browser each). By default = 1.
+            asset_registry (AssetRegistry):
+                The registry with the assets that can be fetched. By default = None (asset_registry/assets.json).
         """
         
         self.web_page = web_page
-        if web_browser == "Chrome":
-            chrome_options = Options()
-            chrome_options.add_argument("--start-maximized")
-            chrome_options.add_argument("--log-level=1")
-            chrome_options.add_argument("--disable-extensions")
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--window-size=1920x1080")
-            self.driver = webdriver.Chrome(options=chrome_options)
+        self.workers = workers
+        self.asset_registry = DEFAULT_ASSET_REGISTRY if asset_registry is None else asset_registry
+        self.page_source = page_source if page_source is not None else SeleniumPageSource(web_browser, web_page, headless=headless, pool_size=workers)
     
     
-    def create_datasets_from_investing(self, folder_path: str, dataset_name: str):
+    @profiled(rows=len)
+    def create_datasets_from_investing(self, folder_path: str, dataset_name: str, start_date: str="2020-01-01", end_date: str="2020-12-31", max_age_hours: float=24.0, incremental: bool=False):
         """
         Using webscraping, this function create a csv file(s) in "folder_path" folder.
+        The assets are fetched concurrently and each csv file is written as soon as its asset is done, so a failed asset does not lose the others.
+        The page source (web browsers) is closed at the end, so it can only be called once for each ObtainCSVFilesFromWeb.
         
         Args:
             folder_path (str):
@@ -51,83 +253,201 @@ class ObtainCSVFilesFromWeb():
             dataset_name (str): 
                 A string representing the csv file to be created. It can take one of the following values: 
                  - "All" to create all datasets.
+                 - The dataset name of an asset of the registry, e.g. with the default assets.json:
                  - "Stocks" to create amundi-msci-wrld-ae-c.csv
                  - "Corporate bonds" to create ishares-global-corporate-bond-$.csv
                  - "Public bonds" to create db-x-trackers-ii-global-sovereign-5.csv
                  - "Golds" to create spdr-gold-trust.csv
                  - "Cash" to create usdollar.csv         
+            start_date (str):
+                First date (YYYY-MM-DD) of the historical data. By default = "2020-01-01" (see exercise statement).
+            end_date (str):
+                Last date (YYYY-MM-DD) of the historical data. By default = "2020-12-31" (see exercise statement).
+            max_age_hours (float):
+                The csv files modified less than max_age_hours ago whose prices cover start_date to end_date are considered fresh and are not fetched again. By default = 24.0 (0 to fetch everything).
+            incremental (bool):
+                A boolean indicating if only the days before the first date and after the last date already stored in each csv file are fetched and merged into it (instead of fetching the whole window). By default = False.
+        Returns:
+            list with the paths of the csv files created.
         """
         
-        assetsid_stockmarket = {
-            "0P00012PP6":"Fund - Luxembourg fund", 
-            "CRPS":"ETF - London etf", 
-            "XG7S":"ETF - Milan etf", 
-            "US78463V1070":"ETF - NYSE etf", 
-            "US Dollar Index (DXY)":"Index - NYSE"
-        }
-        assetsid_csvname = {
-            "0P00012PP6":"amundi-msci-wrld-ae-c.csv", 
-            "CRPS":"ishares-global-corporate-bond-$.csv", 
-            "XG7S":"db-x-trackers-ii-global-sovereign-5.csv", 
-            "US78463V1070":"spdr-gold-trust.csv", 
-            "US Dollar Index (DXY)":"usdollar.csv"
-        }
-        datasets_available = {"Stocks":["CRPS", "XG7S", "US78463V1070", "US Dollar Index (DXY)"], 
-                              "Corporate bonds":["0P00012PP6", "US Dollar Index (DXY)", "XG7S", "US78463V1070"],
-                              "Public bonds":["0P00012PP6", "CRPS", "US78463V1070", "US Dollar Index (DXY)"],
-                              "Golds":["0P00012PP6", "CRPS", "XG7S", "US Dollar Index (DXY)"], 
-                              "Cash":["0P00012PP6", "CRPS", "XG7S", "US78463V1070"]
-        }   
+        assets = [asset for asset in self.asset_registry.assets.values() if dataset_name == "All" or asset["dataset_name"] == dataset_name]
         # Parameter checking.
         try:
-            assert dataset_name == "All" or dataset_name in datasets_available.keys(), f"\033[1m ERROR: \033[0m Please, select a valid .csv file, '{dataset_name}' not available."
+            assert len(assets) > 0, f"\033[1m ERROR: \033[0m Please, select a valid .csv file, '{dataset_name}' not available."
+            assert not getattr(self.page_source, "closed", False), "\033[1m ERROR: \033[0m The web browsers were closed at the end of a previous call, create another ObtainCSVFilesFromWeb."
         except AssertionError as error:
             print(error)
             exit(1)
         
-        if dataset_name in datasets_available.keys():
-            datasets_available = datasets_available.pop(dataset_name)
-            for elem in datasets_available:
-                del assetsid_stockmarket[elem]
-                
-        driver = self.driver
-        driver.get(self.web_page)
+        assetsid_stockmarket = {asset["asset_code"]: asset["stockmarket"] for asset in assets}
+        assetsid_csvname = {asset["asset_code"]: asset["csv_name"] for asset in assets}
+        
+        if os.path.isdir(folder_path) == False: os.mkdir(folder_path)
+        # Assets with fresh output of a previous run (output covering the dates in incremental mode) are skipped.
+        if incremental:
+            assetsid_stockmarket = {asset_code: stockmarket for asset_code, stockmarket in assetsid_stockmarket.items() if self._missing_date_ranges(folder_path + "/" + assetsid_csvname[asset_code], start_date, end_date)}
+        else:
+            assetsid_stockmarket = {asset_code: stockmarket for asset_code, stockmarket in assetsid_stockmarket.items() if not self._is_fresh(folder_path + "/" + assetsid_csvname[asset_code], max_age_hours, start_date, end_date)}
+        
+        created_csv_files, failed_assets = [], []
         try:
-            WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, '//*[@id="onetrust-accept-btn-handler"]'))).click() # Closing popup.
-
-            for asset_code, stockmarket in assetsid_stockmarket.items():
-                # Write the asset code in the searcher line.
-                driver.find_element(by=By.TAG_NAME, value="INPUT").send_keys(asset_code) 
-                # Search button.
-                driver.find_element(by=By.TAG_NAME, value="LABEL").click() 
-                # Select desired asset.
-                WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.PARTIAL_LINK_TEXT, stockmarket))).click() 
-                # Historical data button.
-                driver.find_element(by=By.LINK_TEXT, value="Historical Data").click() 
-                # Opening calendar.
-                WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "widgetFieldDateRange"))).click() 
-                # Modify startDate value.
-                start_date_search_bar = driver.find_element(by=By.ID, value="startDate") 
-                start_date_search_bar.clear()
-                start_date_search_bar.send_keys("01/01/2020") 
-                # Modify endDate value.
-                end_date_search_bar = driver.find_element(by=By.ID, value="endDate")
-                end_date_search_bar.clear()
-                end_date_search_bar.send_keys("12/31/2020")
-                # Applying date changes to the calendar.
-                driver.find_element(by=By.ID, value="applyBtn").click()
-                # Wait until the table is available.
-                html_table = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "curr_table"))) 
-                # Table to html form.
-                df_html = pd.read_html(html_table.get_attribute("outerHTML"), index_col=0) 
-                # Table html to pandas DataFrame.
-                df = pd.DataFrame(df_html[0]).drop(["Open", "High", "Low"], axis=1).convert_dtypes() 
-                # For US Dolar, compute the value of 1 US dolar for that day.
-                if asset_code == "US Dollar Index (DXY)": df["Price"] = round(pd.to_numeric(df["Price"])/100, 3)
-                
-                if os.path.isdir(folder_path) == False: os.mkdir(folder_path) 
-                   
-                df.to_csv(path_or_buf= folder_path + "/" + assetsid_csvname[asset_code]) 
-
-        finally :
-            driver.close() 
\ No newline at end of file
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {asset_code: executor.submit(self._create_dataset, folder_path + "/" + assetsid_csvname[asset_code], asset_code, stockmarket, start_date, end_date, incremental) for asset_code, stockmarket in assetsid_stockmarket.items()}
+                for asset_code, future in futures.items():
+                    try:
+                        created_csv_files.append(future.result())
+                    except Exception as error:
+                        failed_assets.append(asset_code)
+                        print(f"\033[1m ERROR: \033[0m The asset '{asset_code}' could not be obtained ({type(error).__name__}: {error}).")
+        finally:
+            self.page_source.close()
+        
+        if failed_assets: print(f"\033[1m ERROR: \033[0m {len(failed_assets)} asset(s) failed, run it again to fetch only them: {', '.join(failed_assets)}")
+        
+        return created_csv_files
+    
+    
+    @profiled()
+    def _create_dataset(self, csv_file: str, asset_code: str, stockmarket: str, start_date: str, end_date: str, incremental: bool=False):
+        """
+        Fetch the historical data of one asset and write it atomically in csv_file.
+        In incremental mode, only the days before the first date and after the last date stored in csv_file are fetched and merged with the stored ones (the fetched rows win on repeated dates).
+        
+        Args:
+            csv_file (str):
+                A string indicating the path to the csv file to be created.
+            asset_code (str):
+                A string representing the code of the asset.
+            stockmarket (str):
+                A string representing the stock market of the asset.
+            start_date (str):
+                First date (YYYY-MM-DD) of the historical data.
+            end_date (str):
+                Last date (YYYY-MM-DD) of the historical data.
+            incremental (bool):
+                A boolean indicating if only the missing days are fetched. By default = False.
+        Returns:
+            str with the path to the csv file created.
+        """
+        
+        date_ranges = self._missing_date_ranges(csv_file, start_date, end_date) if incremental else [(start_date, end_date)]
+        if not date_ranges: return csv_file
+        merge = incremental and pd.notna(self._stored_date_range(csv_file)[0])
+        df = pd.concat([self.table_to_dataframe(self.page_source.fetch_table_html(asset_code, stockmarket, first_date, last_date), asset_code) for first_date, last_date in date_ranges])
+        add_rows(len(df))
+        if merge:
+            # New and stored rows merged, deduplicated by date and sorted from the most recent date (as in the web page).
+            df = pd.concat([df, pd.read_csv(csv_file, index_col=0)])
+            dates = self._parse_dates(df.index.to_series())
+            keep = ~dates.duplicated().to_numpy()
+            df = df[keep].iloc[np.argsort(dates.to_numpy()[keep])[::-1]]
+        # Written in a temporal file and then renamed, so that a csv file is never partially written.
+        df.to_csv(path_or_buf= csv_file + ".tmp")
+        os.replace(csv_file + ".tmp", csv_file)
+        
+        return csv_file
+    
+    
+    def table_to_dataframe(self, html: str, asset_code: str):
+        """
+        Convert the html of the historical data table of an asset into the pd.DataFrame that is saved as csv.
+        
+        Args:
+            html (str):
+                A string with the html of the table.
+            asset_code (str):
+                A string representing the code of the asset.
+        Returns:
+            pd.DataFrame object indexed by date with the columns "Price", "Vol." (if available) and "Change %".
+        """
+        
+        # Table html to pandas DataFrame.
+        df_html = pd.read_html(StringIO(html), index_col=0)
+        df = pd.DataFrame(df_html[0]).drop(["Open", "High", "Low"], axis=1).convert_dtypes()
+        # Prices with divisor (e.g. for US Dolar, compute the value of 1 US dolar for that day).
+        assets = self.asset_registry.find("asset_code", asset_code)
+        price_divisor = assets[0]["price_divisor"] if assets else 1
+        if price_divisor != 1: df["Price"] = round(pd.to_numeric(df["Price"])/price_divisor, 3)
+        
+        return df
+    
+    
+    def _stored_date_range(self, csv_file: str):
+        """
+        Obtain the first and the last date stored in a csv file created previously.
+        
+        Args:
+            csv_file (str):
+                A string indicating the path to the csv file.
+        Returns:
+            tuple with two pd.Timestamp objects (pd.NaT if the csv file does not exist or it is empty).
+        """
+        
+        if not os.path.exists(csv_file): return pd.NaT, pd.NaT
+        dates = self._parse_dates(pd.read_csv(csv_file, usecols=[0]).iloc[:, 0])
+        
+        return (dates.min(), dates.max()) if len(dates) else (pd.NaT, pd.NaT)
+    
+    
+    def _missing_date_ranges(self, csv_file: str, start_date: str, end_date: str):
+        """
+        Obtain the ranges of dates requested that are not stored in a csv file: before its first date and after its last date (the gaps of up to MAX_UNOBSERVED_DAYS days are weekends and holidays).
+        
+        Args:
+            csv_file (str):
+                A string indicating the path to the csv file.
+            start_date (str):
+                First date (YYYY-MM-DD) requested.
+            end_date (str):
+                Last date (YYYY-MM-DD) requested.
+        Returns:
+            list of tuples (first date, last date) with the YYYY-MM-DD strings of each missing range (empty if the csv file covers the dates).
+        """
+        
+        first_date, last_date = self._stored_date_range(csv_file)
+        if pd.isna(first_date): return [(start_date, end_date)]
+        missing = []
+        if first_date - pd.Timestamp(start_date) > pd.Timedelta(days=MAX_UNOBSERVED_DAYS):
+            missing.append((start_date, str((first_date - pd.Timedelta(days=1)).date())))
+        if pd.Timestamp(end_date) - last_date > pd.Timedelta(days=MAX_UNOBSERVED_DAYS):
+            missing.append((str((last_date + pd.Timedelta(days=1)).date()), end_date))
+        
+        return missing
+    
+    
+    def _parse_dates(self, dates: pd.Series):
+        """
+        Parse the dates of the historical data table (e.g. "Dec 31, 2020").
+        
+        Args:
+            dates (pd.Series):
+                The dates as strings.
+        Returns:
+            pd.Series of datetime64.
+        """
+        
+        try:
+            return pd.to_datetime(dates, format="%b %d, %Y")
+        except ValueError:
+            return pd.to_datetime(dates)
+    
+    
+    def _is_fresh(self, csv_file: str, max_age_hours: float, start_date: str, end_date: str):
+        """
+        Check if a csv file exists, was modified less than max_age_hours ago and covers the dates requested.
+        
+        Args:
+            csv_file (str):
+                A string indicating the path to the csv file.
+            max_age_hours (float):
+                Maximum age (hours) of a fresh csv file.
+            start_date (str):
+                First date (YYYY-MM-DD) requested.
+            end_date (str):
+                Last date (YYYY-MM-DD) requested.
+        Returns:
+            bool.
+        """
+        
+        return os.path.exists(csv_file) and time.time() - os.path.getmtime(csv_file) < max_age_hours*3600 and not self._missing_date_ranges(csv_file, start_date, end_date)